@@ -6,7 +6,7 @@ Combines conversational AI with medical knowledge retrieval
 import os
 import logging
 import asyncio
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, AsyncIterator
 from datetime import datetime
 import json
 import uuid
@@ -37,6 +37,11 @@ from django.core.cache import cache
 
 logger = logging.getLogger(__name__)
 
+_ERROR_FALLBACK = (
+    "I apologize, but I encountered an error. Please try again or seek "
+    "direct medical assistance if this is urgent."
+)
+
 class ConversationCallback:
     """Callback handler for conversation logging and monitoring"""
     
@@ -137,23 +142,7 @@ class IntelligentMedicalChatbot:
         conversation_id = str(uuid.uuid4())
         
         # Create conversation session
-        session = {
-            'conversation_id': conversation_id,
-            'user_id': user_id,
-            'language': language,
-            'start_time': datetime.now().isoformat(),
-            'message_count': 0,
-            'last_activity': datetime.now().isoformat(),
-            'context': session_data or {},
-            'conversation_state': 'active',
-            'emergency_flags': [],
-            'medical_topics': [],
-            'user_preferences': {
-                'detail_level': 'standard',
-                'include_local_context': True,
-                'emergency_alerts': True
-            }
-        }
+        session = self._new_session(conversation_id, user_id, language, session_data)
         
         # Store in memory and cache
         self.active_conversations[conversation_id] = session
@@ -179,6 +168,32 @@ class IntelligentMedicalChatbot:
             }
         }
     
+    def _new_session(
+        self,
+        conversation_id: str,
+        user_id: str,
+        language: str,
+        session_data: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Build a fresh conversation session dict"""
+        return {
+            'conversation_id': conversation_id,
+            'user_id': user_id,
+            'language': language,
+            'start_time': datetime.now().isoformat(),
+            'message_count': 0,
+            'last_activity': datetime.now().isoformat(),
+            'context': session_data or {},
+            'conversation_state': 'active',
+            'emergency_flags': [],
+            'medical_topics': [],
+            'user_preferences': {
+                'detail_level': 'standard',
+                'include_local_context': True,
+                'emergency_alerts': True
+            }
+        }
+    
     async def send_message(
         self,
         conversation_id: str,
@@ -198,72 +213,176 @@ class IntelligentMedicalChatbot:
         Returns:
             Chatbot response with analysis
         """
+        # Get conversation session
+        session = await self._get_conversation_session(conversation_id)
+        if not session:
+            return {
+                'success': False,
+                'error': 'Conversation session not found or expired',
+                'action': 'restart_conversation'
+            }
+        
+        return await self._process_message(session, message, metadata)
+    
+    async def oneshot(self, message: str, language: str = "english") -> Dict[str, Any]:
+        """
+        Answer a single message without persisting a conversation session
+        
+        Returns the same shape as ``send_message`` but uses an in-memory
+        session that is discarded afterwards, skipping the cache writes of
+        start/end conversation.
+        """
+        session = self._new_session(str(uuid.uuid4()), 'legacy_user', language)
+        return await self._process_message(session, message, persist=False)
+    
+    async def _process_message(
+        self,
+        session: Dict[str, Any],
+        message: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        persist: bool = True
+    ) -> Dict[str, Any]:
+        """Run a message through the response pipeline and update the session"""
         try:
-            # Get conversation session
-            session = await self._get_conversation_session(conversation_id)
-            if not session:
-                return {
-                    'success': False,
-                    'error': 'Conversation session not found or expired',
-                    'action': 'restart_conversation'
-                }
+            text, emergency_check, response = await self._begin_message(session, message)
             
-            # Update session activity
-            session['last_activity'] = datetime.now().isoformat()
-            session['message_count'] += 1
-            
-            # Pre-process message
-            processed_message = await self._preprocess_message(message, session)
-            
-            # Check for emergency keywords
-            emergency_check = self._check_emergency_intent(processed_message['text'])
-            
-            if emergency_check['is_emergency']:
-                session['emergency_flags'].append({
-                    'timestamp': datetime.now().isoformat(),
-                    'keywords': emergency_check['keywords'],
-                    'message': message
-                })
-                
-                response = await self._handle_emergency_response(
-                    processed_message['text'], 
-                    session['language']
-                )
-            else:
+            if response is None:
                 # Normal conversation flow
                 response = await self._generate_intelligent_response(
-                    message=processed_message['text'],
+                    message=text,
                     session=session,
                     message_metadata=metadata or {}
                 )
             
-            # Post-process response
-            final_response = await self._postprocess_response(response, session)
-            
-            # Update conversation context
-            await self._update_conversation_context(session, message, final_response)
-            
-            # Save session
-            await self._save_conversation_session(session)
+            return await self._finish_message(session, message, response, emergency_check, persist)
             
+        except Exception as e:
+            logger.error(f"Error processing message: {e}")
             return {
-                'success': True,
-                'response': final_response,
-                'conversation_info': {
-                    'message_count': session['message_count'],
-                    'emergency_detected': emergency_check['is_emergency'],
-                    'medical_topics': session.get('medical_topics', [])[-5:],  # Last 5 topics
-                    'session_duration': self._calculate_session_duration(session)
-                }
+                'success': False,
+                'error': str(e),
+                'fallback_response': _ERROR_FALLBACK
             }
+    
+    async def stream_message(
+        self,
+        conversation_id: str,
+        message: str,
+        message_type: str = "text",
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Send a message and stream the reply as it is generated
+        
+        Yields ``{'type': 'token', 'content': ...}`` events with raw answer
+        text, then a ``{'type': 'done', ...}`` event with the same payload
+        ``send_message`` returns. The ``done`` response is the canonical
+        answer (it includes the personality and disclaimer additions).
+        """
+        try:
+            session = await self._get_conversation_session(conversation_id)
+            if not session:
+                yield {
+                    'type': 'done',
+                    'success': False,
+                    'error': 'Conversation session not found or expired',
+                    'action': 'restart_conversation'
+                }
+                return
+            
+            text, emergency_check, response = await self._begin_message(session, message)
+            
+            if response is not None:
+                yield {'type': 'token', 'content': response['answer']}
+            else:
+                rag_response = None
+                async for event in self.rag_engine.stream_question(
+                    question=text,
+                    conversation_id=session['conversation_id'],
+                    language=session['language'],
+                    include_sources=True
+                ):
+                    if event['type'] == 'final':
+                        rag_response = event['response']
+                    else:
+                        yield event
+                
+                response = await self._enhance_rag_response(rag_response, session)
+            
+            result = await self._finish_message(session, message, response, emergency_check)
+            yield {'type': 'done', **result}
             
         except Exception as e:
-            logger.error(f"Error processing message: {e}")
-            return {
+            logger.error(f"Error streaming message: {e}")
+            yield {
+                'type': 'done',
                 'success': False,
                 'error': str(e),
-                'fallback_response': "I apologize, but I encountered an error. Please try again or seek direct medical assistance if this is urgent."
+                'fallback_response': _ERROR_FALLBACK
+            }
+    
+    async def _begin_message(self, session: Dict[str, Any], message: str) -> tuple:
+        """
+        Shared first half of the pipeline: touch the session, pre-process the
+        message and screen it for emergencies
+        
+        Returns (processed text, emergency check, emergency response); the
+        response is None when the message should go through the RAG flow.
+        """
+        # Update session activity
+        session['last_activity'] = datetime.now().isoformat()
+        session['message_count'] += 1
+        
+        # Pre-process message
+        processed_message = await self._preprocess_message(message, session)
+        
+        # Check for emergency keywords
+        emergency_check = self._check_emergency_intent(processed_message['text'])
+        
+        if not emergency_check['is_emergency']:
+            return processed_message['text'], emergency_check, None
+        
+        session['emergency_flags'].append({
+            'timestamp': datetime.now().isoformat(),
+            'keywords': emergency_check['keywords'],
+            'message': message
+        })
+        
+        response = await self._handle_emergency_response(
+            processed_message['text'],
+            session['language']
+        )
+        return processed_message['text'], emergency_check, response
+    
+    async def _finish_message(
+        self,
+        session: Dict[str, Any],
+        message: str,
+        response: Dict[str, Any],
+        emergency_check: Dict[str, Any],
+        persist: bool = True
+    ) -> Dict[str, Any]:
+        """Shared second half: post-process, record the turn and build the reply"""
+        # Post-process response
+        final_response = await self._postprocess_response(response, session)
+        
+        # Update conversation context
+        await self._update_conversation_context(session, message, final_response)
+        
+        # Save session
+        if persist:
+            await self._save_conversation_session(session)
+        
+        return {
+            'success': True,
+            'response': final_response,
+            'conversation_info': {
+                'message_count': session['message_count'],
+                'emergency_detected': emergency_check['is_emergency'],
+                'medical_topics': session.get('medical_topics', [])[-5:],  # Last 5 topics
+                'session_duration': self._calculate_session_duration(session)
             }
+        }
     
     async def _generate_welcome_message(
         self, 
@@ -423,6 +542,15 @@ class IntelligentMedicalChatbot:
             include_sources=True
         )
         
+        return await self._enhance_rag_response(rag_response, session)
+    
+    async def _enhance_rag_response(
+        self,
+        rag_response: Dict[str, Any],
+        session: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Add conversational context to a RAG engine response"""
+        
         # Enhance with conversational context
         if rag_response['success']:
             # Add personality and empathy
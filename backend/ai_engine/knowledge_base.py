@@ -10,11 +10,47 @@ from typing import Dict, List, Any, Optional
 from pathlib import Path
 from datetime import datetime
 
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+    njit = None
+
 # Django imports
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+
+def _score_symptoms(sym_ids: np.ndarray, matrix: np.ndarray):
+    """
+    Count matched symptoms per condition, and note when each was first matched
+    
+    ``matrix`` is (conditions, symptoms) and holds each condition's 1-based
+    position in that symptom's condition list, 0 where they are unrelated.
+    The second result orders conditions by first match (-1 if unmatched),
+    which is the order the ranking uses to break ties.
+    """
+    n_conditions = matrix.shape[0]
+    scores = np.zeros(n_conditions, dtype=np.int32)
+    first_seen = np.full(n_conditions, -1, dtype=np.int64)
+    for i in range(sym_ids.shape[0]):
+        sym_id = sym_ids[i]
+        for d in range(n_conditions):
+            position = matrix[d, sym_id]
+            if position > 0:
+                scores[d] += 1
+                if first_seen[d] < 0:
+                    first_seen[d] = i * (n_conditions + 1) + position
+    return scores, first_seen
+
+
+if NUMBA_AVAILABLE:
+    _score_symptoms = njit(cache=True, fastmath=True)(_score_symptoms)
+
 class MedicalKnowledgeBase:
     """
     Comprehensive medical knowledge base with Ugandan healthcare context
@@ -38,6 +74,31 @@ class MedicalKnowledgeBase:
         
         # Language mappings
         self.language_translations = self._load_translations()
+        
+        # Integer-keyed symptom/condition matrix for symptom scoring
+        self._build_symptom_matrix()
+    
+    def _build_symptom_matrix(self):
+        """Precompute the (conditions, symptoms) matrix used by symptom scoring"""
+        self.symptom_keys = list(self.symptoms_mapping)
+        self.symptom_to_id = {key: i for i, key in enumerate(self.symptom_keys)}
+        self._symptom_key_words = [key.split('_') for key in self.symptom_keys]
+        
+        self.condition_names = list(dict.fromkeys(
+            condition
+            for conditions in self.symptoms_mapping.values()
+            for condition in conditions
+        ))
+        condition_to_id = {name: i for i, name in enumerate(self.condition_names)}
+        
+        self.disease_symptom_matrix = np.zeros(
+            (len(self.condition_names), len(self.symptom_keys)), dtype=np.int8
+        )
+        # Entries are 1-based positions in each symptom's condition list, so
+        # ties can be broken in the order conditions were listed
+        for key, conditions in self.symptoms_mapping.items():
+            for position, condition in enumerate(conditions, 1):
+                self.disease_symptom_matrix[condition_to_id[condition], self.symptom_to_id[key]] = position
     
     def _load_medical_conditions(self) -> Dict[str, Any]:
         """Load comprehensive medical conditions database"""
@@ -448,26 +509,30 @@ class MedicalKnowledgeBase:
         Returns:
             Analysis results with possible conditions
         """
-        possible_conditions = {}
-        
+        # Map free-text symptoms onto integer symptom IDs
+        sym_ids = []
         for symptom in symptoms:
             symptom_lower = symptom.lower()
-            for key, conditions in self.symptoms_mapping.items():
-                if key in symptom_lower or any(word in symptom_lower for word in key.split('_')):
-                    for condition in conditions:
-                        if condition not in possible_conditions:
-                            possible_conditions[condition] = 0
-                        possible_conditions[condition] += 1
+            for sym_id, key in enumerate(self.symptom_keys):
+                if key in symptom_lower or any(word in symptom_lower for word in self._symptom_key_words[sym_id]):
+                    sym_ids.append(sym_id)
         
-        # Sort by likelihood (number of matching symptoms)
-        sorted_conditions = sorted(
-            possible_conditions.items(), 
-            key=lambda x: x[1], 
-            reverse=True
+        scores, first_seen = _score_symptoms(
+            np.asarray(sym_ids, dtype=np.int64),
+            self.disease_symptom_matrix
         )
         
+        # Sort by likelihood (number of matching symptoms); ties keep the
+        # order the conditions were first matched in
+        ranked = np.lexsort((first_seen, -scores))
+        sorted_conditions = [
+            (self.condition_names[d], int(scores[d]))
+            for d in ranked[:5]
+            if scores[d] > 0
+        ]
+        
         return {
-            'possible_conditions': sorted_conditions[:5],  # Top 5 matches
+            'possible_conditions': sorted_conditions,  # Top 5 matches
             'recommendation': self._get_symptom_recommendation(symptoms),
             'emergency_check': self._check_emergency_symptoms(symptoms)
         }
@@ -5,7 +5,7 @@ Combines vector search with language generation for intelligent medical response
 
 import os
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
 import asyncio
 from datetime import datetime
 import json
@@ -18,8 +18,9 @@ from langchain.prompts import PromptTemplate
 from langchain.llms.base import BaseLLM
 
 # Local imports
-from .vector_store import VectorStoreManager
+from .vector_store import VectorStoreManager, MockEmbeddings
 from .knowledge_base import MedicalKnowledgeBase
+from .semantic_cache import SemanticCache
 
 # Django imports
 from django.conf import settings
@@ -42,6 +43,7 @@ class RAGEngine:
         self.llm = llm
         self.vector_store = VectorStoreManager()
         self.knowledge_base = MedicalKnowledgeBase()
+        self.answer_cache = SemanticCache()
         
         # Initialize conversation memory
         self.memory = ConversationBufferWindowMemory(
@@ -179,8 +181,17 @@ Response:"""
         try:
             self.metrics['total_queries'] += 1
             
+            # Stateless questions can be answered from the semantic cache;
+            # on a miss the same embedding drives retrieval
+            cache_vector = None
+            if not conversation_id:
+                cache_vector = await asyncio.to_thread(self._embed_for_cache, question)
+                cached = self._cache_lookup(cache_vector, language, include_sources)
+                if cached is not None:
+                    return cached
+            
             # Step 1: Retrieve relevant context
-            relevant_context = await self._retrieve_context(question)
+            relevant_context = await self._retrieve_context(question, embedding=cache_vector)
             
             if not relevant_context:
                 self.metrics['failed_retrievals'] += 1
@@ -192,7 +203,7 @@ Response:"""
             question_analysis = self._analyze_question(question)
             
             # Step 3: Generate response
-            response = await self._generate_response(
+            response, from_llm = await self._generate_response(
                 question=question,
                 context=relevant_context,
                 question_type=question_analysis['type'],
@@ -208,6 +219,11 @@ Response:"""
                 relevant_docs=relevant_context.get('documents', [])
             )
             
+            # Fallback text stands in for an LLM outage; caching it would
+            # serve the outage to every near-duplicate until the TTL ran out
+            if cache_vector is not None and from_llm:
+                self.answer_cache.put(cache_vector, final_response, key=(language, include_sources))
+            
             # Update metrics
             response_time = (datetime.now() - start_time).total_seconds()
             self._update_metrics(response_time)
@@ -223,8 +239,50 @@ Response:"""
                 'timestamp': datetime.now().isoformat()
             }
     
-    async def _retrieve_context(self, question: str) -> Dict[str, Any]:
-        """Retrieve relevant context for the question"""
+    def _embed_for_cache(self, question: str) -> Optional[List[float]]:
+        """Embed a question for the answer cache (skipped for mock embeddings)"""
+        embeddings = self.vector_store.embeddings
+        if isinstance(embeddings, MockEmbeddings):
+            return None
+        try:
+            return embeddings.embed_query(question)
+        except Exception as e:
+            logger.warning(f"Could not embed question for answer cache: {e}")
+            return None
+    
+    def _cache_lookup(
+        self,
+        vector: Optional[List[float]],
+        language: str,
+        include_sources: bool
+    ) -> Optional[Dict[str, Any]]:
+        """Return a cached answer for a near-duplicate question, if any"""
+        if vector is None:
+            return None
+        hit = self.answer_cache.get(vector, key=(language, include_sources))
+        if hit is None:
+            return None
+        response = dict(hit)
+        response['timestamp'] = datetime.now().isoformat()
+        response['metadata'] = {**response.get('metadata', {}), 'cached': True}
+        return response
+    
+    async def _retrieve_context(
+        self,
+        question: str,
+        embedding: Optional[List[float]] = None
+    ) -> Dict[str, Any]:
+        """Retrieve relevant context for the question, reusing its embedding if given"""
+        # The vector stores and knowledge base are synchronous; keep them
+        # off the event loop
+        return await asyncio.to_thread(self._retrieve_context_sync, question, embedding)
+    
+    def _retrieve_context_sync(
+        self,
+        question: str,
+        embedding: Optional[List[float]] = None
+    ) -> Dict[str, Any]:
+        """Blocking body of ``_retrieve_context``"""
         try:
             # Multi-strategy retrieval
             context_results = {}
@@ -233,14 +291,16 @@ Response:"""
             semantic_docs = self.vector_store.similarity_search(
                 query=question,
                 k=5,
-                store_type="ensemble" if self.vector_store.ensemble_retriever else "chroma"
+                store_type="ensemble" if self.vector_store.ensemble_retriever else "chroma",
+                embedding=embedding
             )
             
             # 2. Get context with scores
             scored_docs = self.vector_store.semantic_search_with_score(
                 query=question,
                 k=8,
-                score_threshold=0.1
+                score_threshold=0.1,
+                embedding=embedding
             )
             
             # 3. Direct knowledge base search
@@ -259,7 +319,9 @@ Response:"""
                 'scored_documents': scored_docs,
                 'knowledge_base_results': kb_results,
                 'symptom_analysis': symptom_analysis,
-                'formatted_context': self.vector_store.get_relevant_context(question, max_tokens=2000)
+                'formatted_context': self.vector_store.get_relevant_context(
+                    question, max_tokens=2000, embedding=embedding
+                )
             }
             
             return context_results
@@ -337,36 +399,18 @@ Response:"""
         question_type: str,
         language: str,
         conversation_id: Optional[str] = None
-    ) -> str:
-        """Generate response using LLM with context"""
+    ) -> Tuple[str, bool]:
+        """
+        Generate response using LLM with context
+        
+        Returns the answer and whether it came from the LLM (False when the
+        fallback response was used).
+        """
         try:
             if not self.llm:
-                return self._generate_fallback_response(question, context, question_type)
-            
-            # Prepare context string
-            context_text = context.get('formatted_context', '')
-            
-            # Add symptom analysis if available
-            if context.get('symptom_analysis'):
-                symptom_info = context['symptom_analysis']
-                context_text += f"\n\nSymptom Analysis: {json.dumps(symptom_info, indent=2)}"
+                return self._generate_fallback_response(question, context, question_type), False
             
-            # Choose appropriate prompt
-            if conversation_id and self.memory:
-                # Use conversational prompt
-                prompt_input = {
-                    'chat_history': self.memory.chat_memory.messages,
-                    'context': context_text,
-                    'question': question
-                }
-                prompt = self.conversation_prompt.format(**prompt_input)
-            else:
-                # Use Q&A prompt
-                prompt_input = {
-                    'context': context_text,
-                    'question': question
-                }
-                prompt = self.qa_prompt.format(**prompt_input)
+            prompt = self._build_prompt(question, context, conversation_id)
             
             # Generate response
             response = await self.llm.agenerate([prompt])
@@ -379,11 +423,127 @@ Response:"""
                     {'answer': answer}
                 )
             
-            return answer
+            return answer, True
             
         except Exception as e:
             logger.error(f"Error generating LLM response: {e}")
-            return self._generate_fallback_response(question, context, question_type)
+            return self._generate_fallback_response(question, context, question_type), False
+    
+    def _build_prompt(
+        self,
+        question: str,
+        context: Dict[str, Any],
+        conversation_id: Optional[str] = None
+    ) -> str:
+        """Build the LLM prompt from retrieved context"""
+        # Prepare context string
+        context_text = context.get('formatted_context', '')
+        
+        # Add symptom analysis if available
+        if context.get('symptom_analysis'):
+            symptom_info = context['symptom_analysis']
+            context_text += f"\n\nSymptom Analysis: {json.dumps(symptom_info, indent=2)}"
+        
+        # Choose appropriate prompt
+        if conversation_id and self.memory:
+            # Use conversational prompt
+            prompt_input = {
+                'chat_history': self.memory.chat_memory.messages,
+                'context': context_text,
+                'question': question
+            }
+            return self.conversation_prompt.format(**prompt_input)
+        
+        # Use Q&A prompt
+        prompt_input = {
+            'context': context_text,
+            'question': question
+        }
+        return self.qa_prompt.format(**prompt_input)
+    
+    async def stream_question(
+        self,
+        question: str,
+        conversation_id: Optional[str] = None,
+        language: str = "english",
+        include_sources: bool = True
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a RAG answer as it is generated
+        
+        Yields ``{'type': 'token', 'content': ...}`` events while the LLM
+        produces output, followed by a single ``{'type': 'final', 'response': ...}``
+        event carrying the same post-processed dict ``ask_question`` returns.
+        """
+        start_time = datetime.now()
+        
+        try:
+            self.metrics['total_queries'] += 1
+            
+            relevant_context = await self._retrieve_context(question)
+            
+            if not relevant_context:
+                self.metrics['failed_retrievals'] += 1
+                response = await self._handle_no_context(question, language)
+                yield {'type': 'token', 'content': response['answer']}
+                yield {'type': 'final', 'response': response}
+                return
+            
+            self.metrics['successful_retrievals'] += 1
+            
+            question_analysis = self._analyze_question(question)
+            
+            if self.llm:
+                prompt = self._build_prompt(question, relevant_context, conversation_id)
+                parts = []
+                try:
+                    async for chunk in self.llm.astream(prompt):
+                        parts.append(chunk)
+                        yield {'type': 'token', 'content': chunk}
+                    answer = ''.join(parts).strip()
+                except Exception as e:
+                    if parts:
+                        raise
+                    logger.error(f"Error streaming LLM response: {e}")
+                    answer = self._generate_fallback_response(
+                        question, relevant_context, question_analysis['type']
+                    )
+                    yield {'type': 'token', 'content': answer}
+                
+                if conversation_id and self.memory:
+                    self.memory.save_context(
+                        {'question': question},
+                        {'answer': answer}
+                    )
+            else:
+                answer = self._generate_fallback_response(
+                    question, relevant_context, question_analysis['type']
+                )
+                yield {'type': 'token', 'content': answer}
+            
+            final_response = self._post_process_response(
+                response=answer,
+                question_analysis=question_analysis,
+                include_sources=include_sources,
+                relevant_docs=relevant_context.get('documents', [])
+            )
+            
+            response_time = (datetime.now() - start_time).total_seconds()
+            self._update_metrics(response_time)
+            
+            yield {'type': 'final', 'response': final_response}
+            
+        except Exception as e:
+            logger.error(f"Error in RAG streaming: {e}")
+            yield {
+                'type': 'final',
+                'response': {
+                    'success': False,
+                    'answer': "I apologize, but I encountered an error processing your question. Please try again or consult a healthcare provider directly.",
+                    'error': str(e),
+                    'timestamp': datetime.now().isoformat()
+                }
+            }
     
     def _generate_fallback_response(
         self, 
@@ -558,6 +718,8 @@ Response:"""
             success = self.vector_store.add_medical_knowledge(knowledge_data)
             
             if success:
+                # Cached answers may now be stale
+                self.answer_cache.clear()
                 logger.info("Successfully added new medical knowledge")
                 return True
             else:
@@ -0,0 +1,122 @@
+"""
+Semantic Answer Cache for BulamuChainBot
+Reuses RAG answers for questions whose embeddings are near-duplicates
+"""
+
+import threading
+import logging
+import time
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SemanticCache:
+    """
+    Fixed-capacity cache keyed by question embeddings
+
+    Vectors are L2-normalised and stored as int8 with a per-row scale, so
+    the cache takes a quarter of the memory of float32 rows and a lookup
+    is a single integer matmul followed by one dequantising multiply.
+
+    Each entry also carries a key (e.g. the response language) and an
+    insertion time; only unexpired entries with the caller's key compete
+    for the best match.
+    """
+
+    def __init__(self, capacity: int = 1024, threshold: float = 0.95, ttl: float = 3600.0):
+        """
+        Initialize Semantic Cache
+
+        Args:
+            capacity: Maximum number of cached answers (oldest evicted first)
+            threshold: Minimum cosine similarity for a hit
+            ttl: Seconds a cached answer stays valid
+        """
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._q: Optional[np.ndarray] = None
+        self._scales = np.zeros(capacity, dtype=np.float32)
+        self._stamps = np.zeros(capacity, dtype=np.float64)
+        # Keys are interned to small ints so filtering is a vector compare
+        self._key_ids: Dict[Hashable, int] = {}
+        self._slot_keys = np.full(capacity, -1, dtype=np.int32)
+        self._values: List[Any] = [None] * capacity
+        self._size = 0
+        self._next = 0
+
+    @staticmethod
+    def _quantize(vector) -> Optional[tuple]:
+        """Normalise a vector and quantize it to int8 with its scale"""
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        if norm == 0:
+            return None
+        v = v / norm
+        scale = float(np.abs(v).max()) / 127.0
+        return np.round(v / scale).astype(np.int8), scale
+
+    def get(self, vector, key: Hashable = None) -> Optional[Any]:
+        """Return the value for the closest unexpired vector with ``key`` above threshold"""
+        quantized = self._quantize(vector)
+        if quantized is None:
+            return None
+        q, q_scale = quantized
+
+        with self._lock:
+            key_id = self._key_ids.get(key)
+            if key_id is None or not self._size or self._q.shape[1] != q.shape[0]:
+                return None
+            n = self._size
+            candidates = (self._slot_keys[:n] == key_id) & (
+                time.monotonic() - self._stamps[:n] < self.ttl
+            )
+            if not candidates.any():
+                return None
+            # int32 accumulation: int8 * int8 products summed over a few
+            # hundred dimensions overflow int16
+            scores = (self._q[:n].astype(np.int32) @ q.astype(np.int32)).astype(np.float32)
+            scores *= self._scales[:n] * q_scale
+            scores[~candidates] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            return self._values[best]
+
+    def put(self, vector, value: Any, key: Hashable = None):
+        """Cache a value under a vector and key, evicting the oldest entry when full"""
+        quantized = self._quantize(vector)
+        if quantized is None:
+            return
+        q, scale = quantized
+
+        with self._lock:
+            if self._q is None or self._q.shape[1] != q.shape[0]:
+                # Embedding model changed; start over with the new width
+                self._q = np.zeros((self.capacity, q.shape[0]), dtype=np.int8)
+                self._values = [None] * self.capacity
+                self._size = 0
+                self._next = 0
+
+            slot = self._next
+            self._q[slot] = q
+            self._scales[slot] = scale
+            self._stamps[slot] = time.monotonic()
+            self._slot_keys[slot] = self._key_ids.setdefault(key, len(self._key_ids))
+            self._values[slot] = value
+            self._next = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def clear(self):
+        """Drop all cached entries"""
+        with self._lock:
+            self._size = 0
+            self._next = 0
+            self._values = [None] * self.capacity
+
+    def __len__(self) -> int:
+        return self._size
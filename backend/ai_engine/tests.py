@@ -0,0 +1,205 @@
+import itertools
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+import orjson
+from django.test import AsyncRequestFactory, SimpleTestCase
+
+from . import knowledge_base, views
+from .knowledge_base import MedicalKnowledgeBase
+from .rag_engine import RAGEngine
+from .semantic_cache import SemanticCache
+
+
+class SemanticCacheTests(SimpleTestCase):
+    def test_hit_for_near_duplicate_with_same_key(self):
+        cache = SemanticCache()
+        cache.put([1.0, 0.0, 0.0], 'answer', key='english')
+
+        self.assertEqual(cache.get([0.99, 0.01, 0.0], key='english'), 'answer')
+        self.assertIsNone(cache.get([0.0, 1.0, 0.0], key='english'))
+
+    def test_other_key_does_not_mask_a_match(self):
+        cache = SemanticCache()
+        cache.put([1.0, 0.1, 0.0], 'english answer', key='english')
+        # Closer to the query, but cached for another language
+        cache.put([1.0, 0.0, 0.0], 'luganda answer', key='luganda')
+
+        self.assertEqual(cache.get([1.0, 0.0, 0.0], key='english'), 'english answer')
+        self.assertEqual(cache.get([1.0, 0.0, 0.0], key='luganda'), 'luganda answer')
+        self.assertIsNone(cache.get([1.0, 0.0, 0.0], key='swahili'))
+
+    def test_entries_expire(self):
+        cache = SemanticCache(ttl=60)
+        with mock.patch('ai_engine.semantic_cache.time.monotonic', return_value=1000.0):
+            cache.put([1.0, 0.0], 'answer', key='english')
+        with mock.patch('ai_engine.semantic_cache.time.monotonic', return_value=1059.0):
+            self.assertEqual(cache.get([1.0, 0.0], key='english'), 'answer')
+        with mock.patch('ai_engine.semantic_cache.time.monotonic', return_value=1061.0):
+            self.assertIsNone(cache.get([1.0, 0.0], key='english'))
+
+    def test_oldest_entry_evicted_when_full(self):
+        cache = SemanticCache(capacity=2)
+        cache.put([1.0, 0.0, 0.0], 'first', key='english')
+        cache.put([0.0, 1.0, 0.0], 'second', key='english')
+        cache.put([0.0, 0.0, 1.0], 'third', key='english')
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get([1.0, 0.0, 0.0], key='english'))
+        self.assertEqual(cache.get([0.0, 0.0, 1.0], key='english'), 'third')
+
+
+@mock.patch.object(views, 'get_chatbot_instance', lambda: None)
+class IntelligentChatFallbackTests(SimpleTestCase):
+    def post(self, body):
+        request = AsyncRequestFactory().post(
+            '/api/ai/intelligent-chat/', orjson.dumps(body), content_type='application/json'
+        )
+        return views.intelligent_chat(request)
+
+    async def test_unavailable_chatbot_answers_503_in_the_requested_language(self):
+        response = await self.post({'message': 'I have a fever', 'language': 'luganda'})
+
+        self.assertEqual(response.status_code, 503)
+        payload = orjson.loads(response.content)
+        self.assertEqual(payload['system_status'], 'degraded')
+        self.assertEqual(payload['fallback_response'], views._FALLBACK_MESSAGES['luganda'])
+
+    async def test_unknown_language_falls_back_to_english(self):
+        response = await self.post({'message': 'I have a fever', 'language': 'french'})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(orjson.loads(response.content)['fallback_response'], views._FALLBACK_MESSAGES['english'])
+
+
+class IntelligentChatBodyTests(SimpleTestCase):
+    async def test_form_posts_are_rejected(self):
+        request = AsyncRequestFactory().post('/api/ai/intelligent-chat/', {'message': 'I have a fever'})
+
+        response = await views.intelligent_chat(request)
+
+        self.assertEqual(response.status_code, 415)
+
+    async def test_malformed_json_is_rejected(self):
+        request = AsyncRequestFactory().post(
+            '/api/ai/intelligent-chat/', b'{"message": ', content_type='application/json'
+        )
+
+        response = await views.intelligent_chat(request)
+
+        self.assertEqual(response.status_code, 400)
+
+
+class AnswerCacheTests(SimpleTestCase):
+    def engine(self, llm):
+        # Skip __init__: no vector store or knowledge base is needed here
+        engine = RAGEngine.__new__(RAGEngine)
+        engine.llm = llm
+        engine.memory = None
+        engine.answer_cache = SemanticCache()
+        engine.metrics = {
+            'total_queries': 0, 'successful_retrievals': 0,
+            'failed_retrievals': 0, 'avg_response_time': 0.0
+        }
+        context = {'documents': [], 'formatted_context': '', 'knowledge_base_results': {}}
+        for name, value in [
+            ('_embed_for_cache', mock.Mock(return_value=[1.0, 0.0])),
+            ('_retrieve_context', mock.AsyncMock(return_value=context)),
+            ('_build_prompt', mock.Mock(return_value='prompt')),
+        ]:
+            patcher = mock.patch.object(engine, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return engine
+
+    async def test_llm_answers_are_cached(self):
+        llm = mock.Mock()
+        llm.agenerate = mock.AsyncMock(return_value=SimpleNamespace(
+            generations=[[SimpleNamespace(text='Drink plenty of fluids.')]]
+        ))
+        engine = self.engine(llm)
+
+        await engine.ask_question('How do I treat a fever?')
+        cached = await engine.ask_question('How do I treat a fever?')
+
+        self.assertTrue(cached['metadata'].get('cached'))
+        self.assertEqual(llm.agenerate.await_count, 1)
+
+    async def test_fallback_answers_are_not_cached(self):
+        llm = mock.Mock()
+        llm.agenerate = mock.AsyncMock(side_effect=RuntimeError('quota exceeded'))
+        engine = self.engine(llm)
+
+        first = await engine.ask_question('How do I treat a fever?')
+        second = await engine.ask_question('How do I treat a fever?')
+
+        self.assertTrue(first['success'])
+        self.assertNotIn('cached', second['metadata'])
+        self.assertEqual(llm.agenerate.await_count, 2)
+        self.assertEqual(len(engine.answer_cache), 0)
+
+
+class RetrieveContextTests(SimpleTestCase):
+    async def test_retrieval_runs_off_the_event_loop(self):
+        threads = []
+
+        def record(result):
+            def call(*args, **kwargs):
+                threads.append(threading.get_ident())
+                return result
+            return call
+
+        engine = RAGEngine.__new__(RAGEngine)
+        engine.vector_store = mock.Mock(
+            ensemble_retriever=None,
+            similarity_search=record([]),
+            semantic_search_with_score=record([]),
+            get_relevant_context=record('context'),
+        )
+        engine.knowledge_base = mock.Mock(search_knowledge=record({}))
+
+        context = await engine._retrieve_context('What is malaria?', embedding=[1.0, 0.0])
+
+        self.assertEqual(context['formatted_context'], 'context')
+        self.assertEqual(len(threads), 4)
+        self.assertNotIn(threading.get_ident(), threads)
+
+
+class SymptomScoringTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.kb = MedicalKnowledgeBase()
+
+    def dict_scores(self, symptoms):
+        # The dict-based scoring the matrix kernel replaced
+        possible_conditions = {}
+        for symptom in symptoms:
+            symptom_lower = symptom.lower()
+            for key, conditions in self.kb.symptoms_mapping.items():
+                if key in symptom_lower or any(word in symptom_lower for word in key.split('_')):
+                    for condition in conditions:
+                        if condition not in possible_conditions:
+                            possible_conditions[condition] = 0
+                        possible_conditions[condition] += 1
+        return sorted(possible_conditions.items(), key=lambda x: x[1], reverse=True)[:5]
+
+    def test_matches_dict_scoring_including_ties(self):
+        words = ['fever', 'headache', 'cough', 'chest pain', 'fatigue', 'weight loss', 'rash']
+        cases = [[], ['I feel fine'], ['severe abdominal pain'], ['pain'], ['short of breath']]
+        cases += [list(combo) for combo in itertools.permutations(words, 2)]
+        cases += [list(combo) for combo in itertools.permutations(words[:4], 3)]
+
+        kernels = {'pure python': getattr(knowledge_base._score_symptoms, 'py_func', knowledge_base._score_symptoms)}
+        if knowledge_base.NUMBA_AVAILABLE:
+            kernels['numba'] = knowledge_base._score_symptoms
+
+        for name, kernel in kernels.items():
+            with mock.patch.object(knowledge_base, '_score_symptoms', kernel):
+                for symptoms in cases:
+                    with self.subTest(kernel=name, symptoms=symptoms):
+                        self.assertEqual(
+                            self.kb.get_symptoms_analysis(symptoms)['possible_conditions'],
+                            self.dict_scores(symptoms)
+                        )
@@ -304,7 +304,8 @@ class VectorStoreManager:
         query: str, 
         k: int = 5, 
         store_type: str = "chroma",
-        filter_metadata: Optional[Dict] = None
+        filter_metadata: Optional[Dict] = None,
+        embedding: Optional[List[float]] = None
     ) -> List[Document]:
         """
         Perform similarity search
@@ -314,6 +315,8 @@ class VectorStoreManager:
             k: Number of results to return
             store_type: Which store to use ("chroma", "faiss", "ensemble")
             filter_metadata: Optional metadata filters
+            embedding: Precomputed query embedding (not used by "ensemble",
+                whose BM25 half needs the text)
             
         Returns:
             List of relevant documents
@@ -324,6 +327,10 @@ class VectorStoreManager:
                 return []
                 
             if store_type == "chroma" and self.chroma_store:
+                if embedding is not None:
+                    return self.chroma_store.similarity_search_by_vector(
+                        embedding, k=k, filter=filter_metadata
+                    )
                 if filter_metadata:
                     return self.chroma_store.similarity_search(
                         query, k=k, filter=filter_metadata
@@ -332,6 +339,8 @@ class VectorStoreManager:
                     return self.chroma_store.similarity_search(query, k=k)
             
             elif store_type == "faiss" and self.faiss_store:
+                if embedding is not None:
+                    return self.faiss_store.similarity_search_by_vector(embedding, k=k)
                 return self.faiss_store.similarity_search(query, k=k)
             
             elif store_type == "ensemble" and self.ensemble_retriever:
@@ -349,7 +358,8 @@ class VectorStoreManager:
         self, 
         query: str, 
         k: int = 5,
-        score_threshold: float = 0.0
+        score_threshold: float = 0.0,
+        embedding: Optional[List[float]] = None
     ) -> List[Tuple[Document, float]]:
         """
         Perform semantic search with similarity scores
@@ -358,13 +368,19 @@ class VectorStoreManager:
             query: Search query
             k: Number of results
             score_threshold: Minimum similarity score
+            embedding: Precomputed query embedding
             
         Returns:
             List of (document, score) tuples
         """
         try:
             if self.chroma_store:
-                results = self.chroma_store.similarity_search_with_score(query, k=k)
+                if embedding is not None:
+                    results = self.chroma_store.similarity_search_by_vector_with_relevance_scores(
+                        embedding, k=k
+                    )
+                else:
+                    results = self.chroma_store.similarity_search_with_score(query, k=k)
                 # Filter by score threshold
                 return [(doc, score) for doc, score in results if score >= score_threshold]
             else:
@@ -378,7 +394,8 @@ class VectorStoreManager:
         self, 
         query: str, 
         max_tokens: int = 2000,
-        relevance_threshold: float = 0.1
+        relevance_threshold: float = 0.1,
+        embedding: Optional[List[float]] = None
     ) -> str:
         """
         Get relevant context for RAG
@@ -387,6 +404,7 @@ class VectorStoreManager:
             query: User query
             max_tokens: Maximum tokens in context
             relevance_threshold: Minimum relevance score
+            embedding: Precomputed query embedding
             
         Returns:
             Formatted context string
@@ -394,7 +412,7 @@ class VectorStoreManager:
         try:
             # Get relevant documents with scores
             results = self.semantic_search_with_score(
-                query, k=10, score_threshold=relevance_threshold
+                query, k=10, score_threshold=relevance_threshold, embedding=embedding
             )
             
             if not results:
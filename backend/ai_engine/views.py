@@ -6,10 +6,14 @@ Provides API endpoints for intelligent medical chatbot with RAG capabilities
 import json
 import logging
 import asyncio
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, Optional, Union
 from datetime import datetime
 
-from django.http import JsonResponse
+import msgspec
+import orjson
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils.decorators import method_decorator
@@ -34,6 +38,57 @@ logger = logging.getLogger(__name__)
 
 # Initialize chatbot (singleton pattern)
 _chatbot_instance = None
+_chatbot_lock = threading.Lock()
+
+# Fallback bodies are fixed per language, so encode them once at import
+_FALLBACK_MESSAGES = {
+    'english': (
+        "I'm currently experiencing technical difficulties with the advanced AI system. "
+        "For medical questions, please consult with a healthcare provider directly. "
+        "If this is an emergency, please call 999 or go to the nearest hospital immediately."
+    ),
+    'luganda': (
+        "Ndi mu buzibu bw'ekikugu mu sisitemu y'amagezi. "
+        "Ku bibuuzo by'obujjanjabi, nsaba oggende ku musawo. "
+        "Bwe kiba kya maangu, kuba 999 oba genda mu ddwaliro ery'okumpi amangu."
+    ),
+    'swahili': (
+        "Nina shida za kiufundi na mfumo wa akili bandia. "
+        "Kwa maswali ya afya, tafadhali wasiliana na mtaalamu wa afya moja kwa moja. "
+        "Ikiwa ni dharura, piga 999 au nenda hospitali ya karibu haraka."
+    )
+}
+
+_SIMPLE_FALLBACKS = {
+    'english': "I understand you have a medical question. Please consult with a healthcare provider for proper medical advice.",
+    'luganda': "Ntegeera nti olina ekibuuzo ky'obujjanjabi. Nsaba ogende ku musawo afune obujjanjabi obulungi.",
+    'swahili': "Naelewa una swali la kiafya. Tafadhali wasiliana na mtaalamu wa afya kwa ushauri sahihi wa kiafya."
+}
+
+_FALLBACK_RESPONSES_BYTES = {
+    language: orjson.dumps({
+        'success': False,
+        'error': 'AI system temporarily unavailable',
+        'fallback_response': fallback_message,
+        'system_status': 'degraded'
+    })
+    for language, fallback_message in _FALLBACK_MESSAGES.items()
+}
+
+_SIMPLE_FALLBACK_BYTES = {
+    language: orjson.dumps({
+        'success': True,
+        'response': fallback_message,
+        'enhanced': False
+    })
+    for language, fallback_message in _SIMPLE_FALLBACKS.items()
+}
+
+# Successful chat replies share a fixed outer shape; only the values vary
+_REPLY_PREFIX = b'{"success":true,"conversation_id":'
+_REPLY_RESPONSE = b',"response":'
+_REPLY_SESSION_INFO = b',"session_info":'
+_REPLY_CONVERSATION_INFO = b',"conversation_info":'
 
 def run_async(coro):
     """Helper function to run async functions in sync context"""
@@ -52,50 +107,111 @@ def get_chatbot_instance():
     if not CHATBOT_AVAILABLE:
         return None
     
-    if _chatbot_instance is None:
-        try:
-            _chatbot_instance = IntelligentMedicalChatbot()
-            logger.info("Intelligent Medical Chatbot initialized")
-        except Exception as e:
-            logger.error(f"Failed to initialize chatbot: {e}")
-            return None
+    if _chatbot_instance is not None:
+        return _chatbot_instance
+    
+    # Only one request builds the chatbot; the rest wait and reuse it
+    with _chatbot_lock:
+        if _chatbot_instance is None:
+            try:
+                _chatbot_instance = IntelligentMedicalChatbot()
+                logger.info("Intelligent Medical Chatbot initialized")
+            except Exception as e:
+                logger.error(f"Failed to initialize chatbot: {e}")
+                return None
     
     return _chatbot_instance
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def intelligent_chat(request):
-    """Handle intelligent chat messages"""
+class ChatIn(msgspec.Struct, frozen=True):
+    """Request body accepted by ``intelligent_chat``"""
+    message: str = ''
+    conversation_id: Optional[str] = None
+    language: str = 'english'
+    message_type: str = 'text'
+    user_id: Union[str, int] = 'anonymous'
+    session_data: Optional[Dict[str, Any]] = None
+    metadata: Dict[str, Any] = msgspec.field(default_factory=dict)
+
+_chat_decoder = msgspec.json.Decoder(ChatIn)
+
+def _wants_stream(request) -> bool:
+    """Check whether the client asked for a server-sent event stream"""
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+def _sse_response(events) -> StreamingHttpResponse:
+    """Wrap an async iterator of event dicts in a server-sent events response"""
+    async def stream():
+        async for event in events:
+            yield f"data: {json.dumps(event, default=str)}\n\n"
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def _reply_response(conversation_id: str, response: Dict[str, Any],
+                    info_key: bytes, info: Dict[str, Any]) -> HttpResponse:
+    """Splice encoded values into the prebuilt chat reply envelope"""
+    body = b''.join((
+        _REPLY_PREFIX, orjson.dumps(conversation_id),
+        _REPLY_RESPONSE, orjson.dumps(response, default=str),
+        info_key, orjson.dumps(info, default=str),
+        b'}'
+    ))
+    return HttpResponse(body, content_type='application/json')
+
+@csrf_exempt
+@require_http_methods(["POST"])
+async def intelligent_chat(request):
+    """
+    Handle intelligent chat messages
+    
+    The body must be JSON (a ``ChatIn`` object); form and multipart posts
+    are rejected with 415. Clients sending ``Accept: text/event-stream``
+    receive the reply as server-sent events while it is generated; others
+    get the full JSON reply.
+    """
     try:
+        if request.content_type and request.content_type != 'application/json':
+            return JsonResponse({
+                'success': False,
+                'error': 'Request body must be JSON'
+            }, status=415)
+        
         # Parse request
-        data = request.data
-        message = data.get('message', '').strip()
-        conversation_id = data.get('conversation_id')
-        language = data.get('language', 'english')
-        message_type = data.get('message_type', 'text')
-        user_id = data.get('user_id', 'anonymous')
+        try:
+            req = _chat_decoder.decode(request.body or b'{}')
+        except msgspec.DecodeError as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'Invalid request body: {e}'
+            }, status=400)
+        
+        message = req.message.strip()
+        conversation_id = req.conversation_id
+        language = req.language
         
         if not message:
-            return Response({
+            return JsonResponse({
                 'success': False,
                 'error': 'Message is required'
             }, status=400)
         
         # Get chatbot instance
-        chatbot = get_chatbot_instance()
+        chatbot = await sync_to_async(get_chatbot_instance)()
         if not chatbot:
             return _fallback_response(message, language)
         
         # Start new conversation if needed
         if not conversation_id:
-            session_result = run_async(chatbot.start_conversation(
-                user_id=user_id,
+            session_result = await chatbot.start_conversation(
+                user_id=req.user_id,
                 language=language,
-                session_data=data.get('session_data')
-            ))
+                session_data=req.session_data
+            )
             
             if not session_result['success']:
-                return Response({
+                return JsonResponse({
                     'success': False,
                     'error': 'Failed to start conversation'
                 }, status=500)
@@ -103,34 +219,42 @@ def intelligent_chat(request):
             conversation_id = session_result['conversation_id']
             
             # Return welcome message
-            return Response({
-                'success': True,
-                'conversation_id': conversation_id,
-                'response': {
+            return _reply_response(
+                conversation_id,
+                {
                     'answer': session_result['welcome_message'],
                     'question_type': 'welcome',
                     'urgency': 'normal'
                 },
-                'session_info': session_result['session_info']
-            })
+                _REPLY_SESSION_INFO,
+                session_result['session_info']
+            )
+        
+        if _wants_stream(request):
+            return _sse_response(chatbot.stream_message(
+                conversation_id=conversation_id,
+                message=message,
+                message_type=req.message_type,
+                metadata=req.metadata
+            ))
         
         # Send message to chatbot
-        response = run_async(chatbot.send_message(
+        response = await chatbot.send_message(
             conversation_id=conversation_id,
             message=message,
-            message_type=message_type,
-            metadata=data.get('metadata', {})
-        ))
+            message_type=req.message_type,
+            metadata=req.metadata
+        )
         
         if response['success']:
-            return Response({
-                'success': True,
-                'conversation_id': conversation_id,
-                'response': response['response'],
-                'conversation_info': response['conversation_info']
-            })
+            return _reply_response(
+                conversation_id,
+                response['response'],
+                _REPLY_CONVERSATION_INFO,
+                response['conversation_info']
+            )
         else:
-            return Response({
+            return JsonResponse({
                 'success': False,
                 'error': response.get('error', 'Unknown error'),
                 'fallback_response': response.get('fallback_response')
@@ -138,39 +262,19 @@ def intelligent_chat(request):
     
     except Exception as e:
         logger.error(f"Error in intelligent chat: {e}")
-        return Response({
+        return JsonResponse({
             'success': False,
             'error': str(e),
             'fallback': 'I apologize, but I encountered an error. Please try again.'
         }, status=500)
 
-def _fallback_response(message: str, language: str) -> Response:
+def _fallback_response(message: str, language: str) -> HttpResponse:
     """Provide fallback response when chatbot is unavailable"""
-    
-    fallback_messages = {
-        'english': (
-            "I'm currently experiencing technical difficulties with the advanced AI system. "
-            "For medical questions, please consult with a healthcare provider directly. "
-            "If this is an emergency, please call 999 or go to the nearest hospital immediately."
-        ),
-        'luganda': (
-            "Ndi mu buzibu bw'ekikugu mu sisitemu y'amagezi. "
-            "Ku bibuuzo by'obujjanjabi, nsaba oggende ku musawo. "
-            "Bwe kiba kya maangu, kuba 999 oba genda mu ddwaliro ery'okumpi amangu."
-        ),
-        'swahili': (
-            "Nina shida za kiufundi na mfumo wa akili bandia. "
-            "Kwa maswali ya afya, tafadhali wasiliana na mtaalamu wa afya moja kwa moja. "
-            "Ikiwa ni dharura, piga 999 au nenda hospitali ya karibu haraka."
-        )
-    }
-    
-    return Response({
-        'success': False,
-        'error': 'AI system temporarily unavailable',
-        'fallback_response': fallback_messages.get(language, fallback_messages['english']),
-        'system_status': 'degraded'
-    })
+    return HttpResponse(
+        _FALLBACK_RESPONSES_BYTES.get(language, _FALLBACK_RESPONSES_BYTES['english']),
+        content_type='application/json',
+        status=503
+    )
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -293,36 +397,48 @@ def intelligent_voice_chat(request):
             'error': str(e)
         }, status=500)
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def rag_search(request):
-    """Search medical knowledge using RAG"""
+@require_http_methods(["GET"])
+async def rag_search(request):
+    """
+    Search medical knowledge using RAG
+    
+    Streams the answer as server-sent events when the client sends
+    ``Accept: text/event-stream``.
+    """
     try:
         query = request.GET.get('query', '').strip()
         language = request.GET.get('language', 'english')
         
         if not query:
-            return Response({
+            return JsonResponse({
                 'success': False,
                 'error': 'Search query is required'
             }, status=400)
         
-        chatbot = get_chatbot_instance()
+        chatbot = await sync_to_async(get_chatbot_instance)()
         if not chatbot:
-            return Response({
+            return JsonResponse({
                 'success': False,
                 'error': 'RAG system not available'
             }, status=503)
         
         # Use RAG engine directly for search
         rag_engine = chatbot.rag_engine
-        result = run_async(rag_engine.ask_question(
+        
+        if _wants_stream(request):
+            return _sse_response(rag_engine.stream_question(
+                question=query,
+                language=language,
+                include_sources=True
+            ))
+        
+        result = await rag_engine.ask_question(
             question=query,
             language=language,
             include_sources=True
-        ))
+        )
         
-        return Response({
+        return JsonResponse({
             'success': True,
             'query': query,
             'result': result,
@@ -331,7 +447,7 @@ def rag_search(request):
     
     except Exception as e:
         logger.error(f"Error in RAG search: {e}")
-        return Response({
+        return JsonResponse({
             'success': False,
             'error': str(e)
         }, status=500)
@@ -520,35 +636,10 @@ def legacy_chat(request):
         chatbot = get_chatbot_instance()
         if not chatbot:
             # Fallback to simple responses
-            return Response({
-                'success': True,
-                'response': _get_simple_fallback(message, language),
-                'enhanced': False
-            })
+            return _simple_fallback_response(message, language)
         
-        # Start a temporary conversation
-        session_result = run_async(chatbot.start_conversation(
-            user_id='legacy_user',
-            language=language
-        ))
-        
-        if not session_result['success']:
-            return Response({
-                'success': True,
-                'response': _get_simple_fallback(message, language),
-                'enhanced': False
-            })
-        
-        conversation_id = session_result['conversation_id']
-        
-        # Send message
-        response = run_async(chatbot.send_message(
-            conversation_id=conversation_id,
-            message=message
-        ))
-        
-        # End conversation immediately for legacy compatibility
-        run_async(chatbot.end_conversation(conversation_id))
+        # Answer in a throwaway session for legacy compatibility
+        response = run_async(chatbot.oneshot(message, language))
         
         if response['success']:
             return Response({
@@ -576,11 +667,11 @@ def legacy_chat(request):
 
 def _get_simple_fallback(message: str, language: str) -> str:
     """Simple fallback responses"""
-    
-    fallbacks = {
-        'english': "I understand you have a medical question. Please consult with a healthcare provider for proper medical advice.",
-        'luganda': "Ntegeera nti olina ekibuuzo ky'obujjanjabi. Nsaba ogende ku musawo afune obujjanjabi obulungi.",
-        'swahili': "Naelewa una swali la kiafya. Tafadhali wasiliana na mtaalamu wa afya kwa ushauri sahihi wa kiafya."
-    }
-    
-    return fallbacks.get(language, fallbacks['english'])
+    return _SIMPLE_FALLBACKS.get(language, _SIMPLE_FALLBACKS['english'])
+
+def _simple_fallback_response(message: str, language: str) -> HttpResponse:
+    """Legacy chat response wrapping the simple fallback message"""
+    return HttpResponse(
+        _SIMPLE_FALLBACK_BYTES.get(language, _SIMPLE_FALLBACK_BYTES['english']),
+        content_type='application/json'
+    )
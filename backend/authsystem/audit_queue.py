@@ -0,0 +1,30 @@
+"""
+Write-behind queue for LoginAttempt audit rows
+Login requests enqueue unsaved rows; a daemon thread bulk-inserts them
+"""
+
+from bulamuchain.write_behind import WriteBehindQueue
+
+from .models import LoginAttempt
+
+writer = WriteBehindQueue(
+    LoginAttempt,
+    name='login-attempt-writer',
+    flush_interval=0.2,
+    prepare=LoginAttempt.prepare_user_agent
+)
+
+
+def flush():
+    """Write every queued attempt now"""
+    writer.flush()
+
+
+def enqueue_login_attempt(attempt):
+    """
+    Queue an unsaved LoginAttempt for batched insertion
+    
+    Falls back to a synchronous save when the queue is full, so bursts
+    slow the login path down instead of dropping audit rows.
+    """
+    writer.put(attempt)
@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from authsystem.models import OTPVerification
+
+
+class Command(BaseCommand):
+    help = 'Delete OTP records that expired more than --days days ago'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=1,
+                            help='Grace period after expiry before a code is purged')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Rows deleted per statement')
+
+    def handle(self, *args, **options):
+        stale = OTPVerification.objects.stale(timedelta(days=options['days'])).order_by()
+        batch_size = options['batch_size']
+        total = 0
+
+        # Delete in bounded batches so the table is never locked for long
+        while True:
+            pks = list(stale.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            deleted, _ = OTPVerification.objects.filter(pk__in=pks).delete()
+            total += deleted
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {total} expired OTP records'))
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.8 on 2026-10-15 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authsystem', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='otpverification',
+            index=models.Index(fields=['user', 'otp_type', 'is_used', 'expires_at'], name='authsystem__user_id_bd2df5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='otpverification',
+            index=models.Index(fields=['phone_number', 'otp_type'], name='authsystem__phone_n_4583e8_idx'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.0.8 on 2026-10-15 23:05
+
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def hash_otp_code(code):
+    return hmac.new(settings.SECRET_KEY.encode(), str(code).encode(), hashlib.sha256).digest()
+
+
+def hash_existing_codes(apps, schema_editor):
+    OTPVerification = apps.get_model('authsystem', 'OTPVerification')
+    for otp in OTPVerification.objects.only('id', 'code').iterator():
+        otp.code_hash = hash_otp_code(otp.code)
+        otp.save(update_fields=['code_hash'])
+
+    CustomUser = apps.get_model('authsystem', 'CustomUser')
+    for user in CustomUser.objects.exclude(verification_code='').only('id', 'verification_code').iterator():
+        user.verification_code_hash = hash_otp_code(user.verification_code)
+        user.save(update_fields=['verification_code_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authsystem', '0002_otpverification_authsystem__user_id_bd2df5_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='otpverification',
+            name='code_hash',
+            field=models.BinaryField(default=b'', max_length=32),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='verification_code_hash',
+            field=models.BinaryField(blank=True, default=b'', max_length=32),
+        ),
+        migrations.RunPython(hash_existing_codes, migrations.RunPython.noop),
+        # Give the plaintext columns a default before dropping them, so
+        # unapplying can re-add them to tables that already have rows
+        migrations.AlterField(
+            model_name='otpverification',
+            name='code',
+            field=models.CharField(default='', max_length=6),
+        ),
+        migrations.AlterField(
+            model_name='customuser',
+            name='verification_code',
+            field=models.CharField(blank=True, default='', max_length=6),
+        ),
+        migrations.RemoveField(
+            model_name='otpverification',
+            name='code',
+        ),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='verification_code',
+        ),
+        migrations.AddIndex(
+            model_name='otpverification',
+            index=models.Index(fields=['code_hash'], name='authsystem__code_ha_6a1ef8_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.8 on 2026-10-15 23:12
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def cap_user_agents(apps, schema_editor):
+    LoginAttempt = apps.get_model('authsystem', 'LoginAttempt')
+    for attempt in LoginAttempt.objects.only('id', 'user_agent').iterator():
+        user_agent = attempt.user_agent or ''
+        attempt.user_agent_hash = hashlib.blake2b(user_agent.encode(), digest_size=16).digest()
+        attempt.user_agent = user_agent[:512]
+        attempt.save(update_fields=['user_agent', 'user_agent_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authsystem', '0003_otp_code_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='loginattempt',
+            name='user_agent_hash',
+            field=models.BinaryField(default=b'', max_length=16),
+        ),
+        migrations.RunPython(cap_user_agents, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='loginattempt',
+            name='user_agent',
+            field=models.CharField(blank=True, max_length=512),
+        ),
+        migrations.AddIndex(
+            model_name='loginattempt',
+            index=models.Index(fields=['user_agent_hash'], name='authsystem__user_ag_b57431_idx'),
+        ),
+    ]
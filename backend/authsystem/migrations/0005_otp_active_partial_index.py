@@ -0,0 +1,21 @@
+# Generated by Django 5.0.8 on 2026-10-15 23:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authsystem', '0004_loginattempt_user_agent_hash_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='otpverification',
+            name='authsystem__code_ha_6a1ef8_idx',
+        ),
+        migrations.AddIndex(
+            model_name='otpverification',
+            index=models.Index(condition=models.Q(('is_used', False)), fields=['code_hash'], name='idx_otp_active'),
+        ),
+    ]
@@ -1,8 +1,17 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.utils import timezone
+import hashlib
+import hmac
 import uuid
 
+
+def hash_otp_code(code):
+    """HMAC-SHA256 digest of a one-time code, keyed with the project secret"""
+    return hmac.new(settings.SECRET_KEY.encode(), str(code).encode(), hashlib.sha256).digest()
+
+
 class CustomUser(AbstractUser):
     """
     Extended User model for BulamuChainBot
@@ -18,7 +27,7 @@ class CustomUser(AbstractUser):
     user_type = models.CharField(max_length=10, choices=USER_TYPES, default='patient')
     phone_number = models.CharField(max_length=20, unique=True, null=True, blank=True)
     is_verified = models.BooleanField(default=False)
-    verification_code = models.CharField(max_length=6, blank=True)
+    verification_code_hash = models.BinaryField(max_length=32, blank=True, default=b'')
     
     # Profile completion
     profile_completed = models.BooleanField(default=False)
@@ -121,7 +130,8 @@ class LoginAttempt(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     username = models.CharField(max_length=150)
     ip_address = models.GenericIPAddressField()
-    user_agent = models.TextField()
+    user_agent = models.CharField(max_length=512, blank=True)
+    user_agent_hash = models.BinaryField(max_length=16, default=b'')
     attempt_type = models.CharField(max_length=20, choices=ATTEMPT_TYPES)
     
     # Geolocation (optional)
@@ -135,11 +145,39 @@ class LoginAttempt(models.Model):
         indexes = [
             models.Index(fields=['username', 'timestamp']),
             models.Index(fields=['ip_address', 'timestamp']),
+            models.Index(fields=['user_agent_hash']),
         ]
     
+    @staticmethod
+    def hash_user_agent(user_agent):
+        return hashlib.blake2b(user_agent.encode(), digest_size=16).digest()
+    
+    def prepare_user_agent(self):
+        # Keep the full-agent digest for grouping even when the stored text is capped
+        user_agent = self.user_agent or ''
+        self.user_agent_hash = self.hash_user_agent(user_agent)
+        self.user_agent = user_agent[:512]
+    
+    def save(self, *args, **kwargs):
+        self.prepare_user_agent()
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return f"{self.attempt_type} - {self.username} from {self.ip_address}"
 
+class OTPVerificationQuerySet(models.QuerySet):
+    def valid(self):
+        """OTPs that are unused, under their attempt limit and not yet expired"""
+        return self.filter(
+            is_used=False,
+            attempts__lt=models.F('max_attempts'),
+            expires_at__gt=timezone.now()
+        )
+    
+    def stale(self, grace):
+        """OTPs that expired more than ``grace`` (a timedelta) ago"""
+        return self.filter(expires_at__lt=timezone.now() - grace)
+
 class OTPVerification(models.Model):
     """
     One-time passwords for phone verification and password reset
@@ -156,7 +194,7 @@ class OTPVerification(models.Model):
     otp_type = models.CharField(max_length=20, choices=OTP_TYPES)
     phone_number = models.CharField(max_length=20)
     
-    code = models.CharField(max_length=6)
+    code_hash = models.BinaryField(max_length=32)
     is_used = models.BooleanField(default=False)
     attempts = models.PositiveIntegerField(default=0)
     max_attempts = models.PositiveIntegerField(default=3)
@@ -165,11 +203,20 @@ class OTPVerification(models.Model):
     expires_at = models.DateTimeField()
     used_at = models.DateTimeField(null=True, blank=True)
     
+    objects = OTPVerificationQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'otp_type', 'is_used', 'expires_at']),
+            models.Index(fields=['phone_number', 'otp_type']),
+            # Every code lookup filters on is_used=False, so spent codes
+            # stay out of the index
+            models.Index(fields=['code_hash'], condition=models.Q(is_used=False), name='idx_otp_active'),
+        ]
     
     def is_valid(self):
         return not self.is_used and self.attempts < self.max_attempts and timezone.now() < self.expires_at
     
     def __str__(self):
-        return f"OTP {self.code} for {self.user.username} ({self.otp_type})"
+        return f"OTP for {self.user.username} ({self.otp_type})"
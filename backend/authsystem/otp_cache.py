@@ -0,0 +1,59 @@
+"""
+Shared-cache index of the newest OTP per user and purpose
+Lets verification reject wrong codes without a database round-trip
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Only a cache shared between workers can be trusted to reject codes;
+# without the 'otp' alias every lookup goes to the database
+OTP_CACHE_ENABLED = 'otp' in settings.CACHES
+
+
+def _key(user_id, otp_type):
+    return f"otp_{user_id}_{otp_type}"
+
+
+def remember_otp(otp):
+    """Record a freshly issued OTP once its row has committed"""
+    if not OTP_CACHE_ENABLED:
+        return
+
+    timeout = max(int((otp.expires_at - timezone.now()).total_seconds()), 1)
+    key = _key(otp.user_id, otp.otp_type)
+    code_hash = bytes(otp.code_hash)
+    transaction.on_commit(lambda: caches['otp'].set(key, code_hash, timeout=timeout))
+
+
+def is_known_wrong(user_id, otp_type, code_hash):
+    """
+    True when the cache proves ``code_hash`` is not the user's current code
+
+    A cache miss (or a cache error) is never treated as proof, so callers
+    fall through to the database.
+    """
+    if not OTP_CACHE_ENABLED:
+        return False
+
+    try:
+        current = caches['otp'].get(_key(user_id, otp_type))
+    except Exception as e:
+        logger.warning(f"OTP cache unavailable: {e}")
+        return False
+    return current is not None and current != code_hash
+
+
+def forget_otp(user_id, otp_type):
+    """Drop the cached code after it has been used"""
+    if not OTP_CACHE_ENABLED:
+        return
+
+    key = _key(user_id, otp_type)
+    transaction.on_commit(lambda: caches['otp'].delete(key))
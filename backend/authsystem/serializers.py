@@ -1,9 +1,148 @@
+import re
+
 from rest_framework import serializers
-from django.contrib.auth import get_user_model
+from django.db.models import Q
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError as DjangoValidationError
 from .models import CustomUser, UserProfile, DoctorProfile, OTPVerification
 
-User = get_user_model()
+_PHONE_RE = re.compile(r'^\+?[1-9]\d{1,14}$')
+
+USER_TYPE_LABELS = dict(CustomUser.USER_TYPES)
+SPECIALIZATION_LABELS = dict(DoctorProfile.SPECIALIZATIONS)
+
+class ChoiceLabelField(serializers.Field):
+    """
+    Read-only field that renders a choice value's label from a prebuilt dict
+    """
+    def __init__(self, labels, **kwargs):
+        kwargs['read_only'] = True
+        self.labels = labels
+        super().__init__(**kwargs)
+    
+    def to_representation(self, value):
+        return self.labels.get(value, value)
+
+_TAKEN_MESSAGES = {
+    'email': "Email already registered",
+    'username': "Username already taken",
+    'phone_number': "Phone number already registered",
+    'doctor_profile__license_number': "License number already registered",
+}
+
+def check_password_strength(password, field='password'):
+    """
+    Run Django's password validators, reporting errors against ``field``
+    """
+    try:
+        validate_password(password)
+    except DjangoValidationError as e:
+        raise serializers.ValidationError({field: list(e.messages)})
+
+def check_registration_conflicts(attrs, license_number=None):
+    """
+    Check email, username, phone number (and license number) in one query
+    """
+    lookup = Q(email=attrs['email']) | Q(username=attrs['username'])
+    wanted = {'email': attrs['email'], 'username': attrs['username']}
+    
+    if attrs.get('phone_number'):
+        lookup |= Q(phone_number=attrs['phone_number'])
+        wanted['phone_number'] = attrs['phone_number']
+    
+    if license_number:
+        lookup |= Q(doctor_profile__license_number=license_number)
+        wanted['doctor_profile__license_number'] = license_number
+    
+    errors = {}
+    for row in CustomUser.objects.filter(lookup).values(*wanted):
+        for field, value in wanted.items():
+            if row[field] == value:
+                errors[field.rsplit('__', 1)[-1]] = [_TAKEN_MESSAGES[field]]
+    
+    if errors:
+        raise serializers.ValidationError(errors)
+
+def find_batch_conflicts(rows):
+    """
+    Check a batch of validated registrations against the database and each
+    other in one query; returns {row_index: field_errors}
+    """
+    fields = ('email', 'username', 'phone_number')
+    values = {field: {attrs[field] for attrs in rows if attrs.get(field)} for field in fields}
+    
+    lookup = Q()
+    for field in fields:
+        if values[field]:
+            lookup |= Q(**{f'{field}__in': values[field]})
+    
+    taken = {field: set() for field in fields}
+    if lookup:
+        for row in CustomUser.objects.filter(lookup).values(*fields):
+            for field in fields:
+                if row[field] in values[field]:
+                    taken[field].add(row[field])
+    
+    errors = {}
+    for index, attrs in enumerate(rows):
+        row_errors = {}
+        for field in fields:
+            value = attrs.get(field)
+            if value and value in taken[field]:
+                row_errors[field] = [_TAKEN_MESSAGES[field]]
+        
+        if row_errors:
+            errors[index] = row_errors
+        else:
+            # Later rows in the batch may not reuse this row's details
+            for field in fields:
+                if attrs.get(field):
+                    taken[field].add(attrs[field])
+    
+    return errors
+
+# Unique columns behind _TAKEN_MESSAGES, as (table, column)
+_UNIQUE_COLUMNS = {
+    (CustomUser._meta.db_table, 'email'): 'email',
+    (CustomUser._meta.db_table, 'username'): 'username',
+    (CustomUser._meta.db_table, 'phone_number'): 'phone_number',
+    (DoctorProfile._meta.db_table, 'license_number'): 'doctor_profile__license_number',
+}
+
+# SQLite names the columns: "UNIQUE constraint failed: table.column"
+_SQLITE_UNIQUE_RE = re.compile(r'UNIQUE constraint failed: ([\w.]+(?:, [\w.]+)*)')
+
+def integrity_error_detail(exc):
+    """
+    Map a unique-constraint IntegrityError raised on registration to field errors
+    
+    The field is taken from the violated constraint's name (PostgreSQL) or
+    the columns SQLite reports, never from the rest of the message, which
+    can echo the submitted values.
+    """
+    constraint = getattr(getattr(exc.__cause__, 'diag', None), 'constraint_name', None)
+    match = _SQLITE_UNIQUE_RE.search(str(exc))
+    columns = set(match.group(1).split(', ')) if match else set()
+    
+    for (table, column), field in _UNIQUE_COLUMNS.items():
+        if constraint:
+            # <table>_<column>_key, or Django's <table>_<column>_<hash>_uniq
+            violated = constraint.startswith(f'{table}_{column}_')
+        else:
+            violated = f'{table}.{column}' in columns
+        if violated:
+            return {field.rsplit('__', 1)[-1]: [_TAKEN_MESSAGES[field]]}
+    return {'non_field_errors': ["Account details already registered"]}
+
+# Uniqueness is checked in one query by check_registration_conflicts and
+# enforced by the database, so ModelSerializer's per-field UniqueValidators
+# are dropped; username keeps its format validator
+_REGISTRATION_EXTRA_KWARGS = {
+    'email': {'required': True},
+    'username': {'validators': [UnicodeUsernameValidator()]},
+    'phone_number': {'validators': []},
+}
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """
@@ -11,7 +150,6 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
     """
     password = serializers.CharField(
         write_only=True, 
-        validators=[validate_password],
         help_text="Password must be at least 8 characters long"
     )
     password_confirm = serializers.CharField(write_only=True)
@@ -22,48 +160,31 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
             'username', 'email', 'password', 'password_confirm',
             'first_name', 'last_name', 'phone_number', 'user_type'
         ]
-        extra_kwargs = {
-            'email': {'required': True}
-        }
+        extra_kwargs = _REGISTRATION_EXTRA_KWARGS
     
     def validate(self, attrs):
+        # Mismatches are cheap to spot; check them before the validators
         if attrs['password'] != attrs['password_confirm']:
             raise serializers.ValidationError("Passwords don't match")
         
+        check_password_strength(attrs['password'])
+        
+        # Bulk imports check the whole batch at once (find_batch_conflicts)
+        if not self.context.get('bulk'):
+            check_registration_conflicts(attrs)
+        
         # Remove password_confirm from validated data
         attrs.pop('password_confirm')
         return attrs
     
-    def validate_email(self, value):
-        if CustomUser.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Email already registered")
-        return value
-    
-    def validate_username(self, value):
-        if CustomUser.objects.filter(username=value).exists():
-            raise serializers.ValidationError("Username already taken")
-        return value
-    
-    def validate_phone_number(self, value):
-        if value and CustomUser.objects.filter(phone_number=value).exists():
-            raise serializers.ValidationError("Phone number already registered")
-        return value
-    
     def create(self, validated_data):
-        password = validated_data.pop('password')
-        user = CustomUser.objects.create_user(**validated_data)
-        user.set_password(password)
-        user.save()
-        return user
+        return CustomUser.objects.create_user(**validated_data)
 
 class DoctorRegistrationSerializer(serializers.ModelSerializer):
     """
     Serializer for doctor registration
     """
-    password = serializers.CharField(
-        write_only=True, 
-        validators=[validate_password]
-    )
+    password = serializers.CharField(write_only=True)
     password_confirm = serializers.CharField(write_only=True)
     license_number = serializers.CharField()
     specialization = serializers.CharField()
@@ -76,34 +197,27 @@ class DoctorRegistrationSerializer(serializers.ModelSerializer):
             'first_name', 'last_name', 'phone_number',
             'license_number', 'specialization', 'hospital_name'
         ]
-        extra_kwargs = {
-            'email': {'required': True}
-        }
+        extra_kwargs = _REGISTRATION_EXTRA_KWARGS
     
     def validate(self, attrs):
         if attrs['password'] != attrs['password_confirm']:
             raise serializers.ValidationError("Passwords don't match")
         
+        check_password_strength(attrs['password'])
+        check_registration_conflicts(attrs, license_number=attrs['license_number'])
+        
         attrs.pop('password_confirm')
         return attrs
     
-    def validate_license_number(self, value):
-        if DoctorProfile.objects.filter(license_number=value).exists():
-            raise serializers.ValidationError("License number already registered")
-        return value
-    
     def create(self, validated_data):
         # Extract doctor-specific fields
         license_number = validated_data.pop('license_number')
         specialization = validated_data.pop('specialization')
         hospital_name = validated_data.pop('hospital_name', '')
         
-        # Create user
-        password = validated_data.pop('password')
+        # Create user; create_user hashes the password
         validated_data['user_type'] = 'doctor'
         user = CustomUser.objects.create_user(**validated_data)
-        user.set_password(password)
-        user.save()
         
         # Create doctor profile
         DoctorProfile.objects.create(
@@ -115,11 +229,30 @@ class DoctorRegistrationSerializer(serializers.ModelSerializer):
         
         return user
 
+class ProfileUserInfoSerializer(serializers.ModelSerializer):
+    """
+    Read-only user details nested in profile responses
+    """
+    full_name = serializers.CharField(source='get_full_name', read_only=True)
+    
+    class Meta:
+        model = CustomUser
+        fields = ['username', 'email', 'full_name', 'user_type', 'is_verified', 'phone_number']
+        read_only_fields = fields
+
+class DoctorUserInfoSerializer(ProfileUserInfoSerializer):
+    """
+    Read-only user details nested in doctor profile responses
+    """
+    class Meta(ProfileUserInfoSerializer.Meta):
+        fields = ['username', 'email', 'full_name', 'phone_number']
+        read_only_fields = fields
+
 class UserProfileSerializer(serializers.ModelSerializer):
     """
     Serializer for user profile
     """
-    user_info = serializers.SerializerMethodField()
+    user_info = ProfileUserInfoSerializer(source='user', read_only=True)
     
     class Meta:
         model = UserProfile
@@ -129,22 +262,13 @@ class UserProfileSerializer(serializers.ModelSerializer):
             'profile_visibility', 'data_sharing_consent', 'user_info'
         ]
     
-    def get_user_info(self, obj):
-        return {
-            'username': obj.user.username,
-            'email': obj.user.email,
-            'full_name': obj.user.get_full_name(),
-            'user_type': obj.user.user_type,
-            'is_verified': obj.user.is_verified,
-            'phone_number': obj.user.phone_number
-        }
 
 class DoctorProfileSerializer(serializers.ModelSerializer):
     """
     Serializer for doctor profile
     """
-    user_info = serializers.SerializerMethodField()
-    specialization_display = serializers.CharField(source='get_specialization_display', read_only=True)
+    user_info = DoctorUserInfoSerializer(source='user', read_only=True)
+    specialization_display = ChoiceLabelField(SPECIALIZATION_LABELS, source='specialization')
     
     class Meta:
         model = DoctorProfile
@@ -155,14 +279,6 @@ class DoctorProfileSerializer(serializers.ModelSerializer):
             'consultation_fee', 'user_info'
         ]
         read_only_fields = ['license_number', 'is_verified']
-    
-    def get_user_info(self, obj):
-        return {
-            'username': obj.user.username,
-            'email': obj.user.email,
-            'full_name': obj.user.get_full_name(),
-            'phone_number': obj.user.phone_number
-        }
 
 class OTPRequestSerializer(serializers.Serializer):
     """
@@ -175,8 +291,7 @@ class OTPRequestSerializer(serializers.Serializer):
     
     def validate_phone_number(self, value):
         # Basic phone number validation
-        import re
-        if not re.match(r'^\+?[1-9]\d{1,14}$', value.replace(' ', '')):
+        if not _PHONE_RE.match(value.replace(' ', '')):
             raise serializers.ValidationError("Invalid phone number format")
         return value
 
@@ -208,13 +323,15 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
     Serializer for password reset confirmation
     """
     otp_code = serializers.CharField(max_length=6, min_length=6)
-    new_password = serializers.CharField(validators=[validate_password])
+    new_password = serializers.CharField()
     new_password_confirm = serializers.CharField()
     
     def validate(self, attrs):
         if attrs['new_password'] != attrs['new_password_confirm']:
             raise serializers.ValidationError("Passwords don't match")
         
+        check_password_strength(attrs['new_password'], field='new_password')
+        
         attrs.pop('new_password_confirm')
         return attrs
     
@@ -244,7 +361,7 @@ class UserSummarySerializer(serializers.ModelSerializer):
     Lightweight serializer for user information
     """
     full_name = serializers.CharField(source='get_full_name', read_only=True)
-    user_type_display = serializers.CharField(source='get_user_type_display', read_only=True)
+    user_type_display = ChoiceLabelField(USER_TYPE_LABELS, source='user_type')
     
     class Meta:
         model = CustomUser
@@ -0,0 +1,39 @@
+"""
+Off-request SMS dispatch for OTP codes
+Messages are handed to a worker thread once the OTP row has committed
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='otp-sms')
+
+
+def send_sms(phone_number, message):
+    """
+    Deliver a single SMS
+
+    No SMS gateway is integrated yet. With DEBUG on the message is printed
+    to the console so codes can be used in development; otherwise delivery
+    is only logged, without the body because it carries a one-time code.
+    """
+    if settings.DEBUG:
+        print(f"SMS to {phone_number}: {message}")
+        return
+    
+    logger.info(f"SMS to ...{phone_number[-4:]} not delivered: no SMS gateway is configured")
+
+
+def queue_sms(phone_number, message):
+    """
+    Send an SMS after the current transaction commits
+
+    Outside a transaction the message is handed off immediately; either way
+    the request does not wait on the gateway.
+    """
+    transaction.on_commit(lambda: _executor.submit(send_sms, phone_number, message))
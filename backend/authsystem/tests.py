@@ -1,3 +1,384 @@
-from django.test import TestCase
+import io
+import queue
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+
+from .models import CustomUser, LoginAttempt, OTPVerification, UserProfile, hash_otp_code
+from . import audit_queue, otp_cache, sms, views
+from .serializers import UserSummarySerializer, integrity_error_detail
+
+
+def _row(username, **extra):
+    row = {
+        'username': username,
+        'email': f'{username}@example.com',
+        'password': 'Kampala-Clinic-42',
+        'password_confirm': 'Kampala-Clinic-42',
+        'first_name': 'Test',
+        'last_name': 'User',
+    }
+    row.update(extra)
+    return row
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class BulkRegisterTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_user(
+            username='admin', email='admin@example.com', password='x', is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse('bulk-register')
+
+    def test_creates_users_and_profiles(self):
+        response = self.client.post(self.url, [_row('alice'), _row('bob')], format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([u['username'] for u in response.data['created']], ['alice', 'bob'])
+        self.assertEqual(response.data['errors'], {})
+        alice = CustomUser.objects.get(username='alice')
+        self.assertTrue(alice.check_password('Kampala-Clinic-42'))
+        self.assertTrue(UserProfile.objects.filter(user=alice).exists())
+
+    def test_reports_invalid_and_conflicting_rows_by_index(self):
+        CustomUser.objects.create_user(username='taken', email='taken@example.com', password='x')
+        rows = [
+            _row('carol'),
+            _row('taken'),                                 # username in the database
+            _row('dave', email='carol@example.com'),       # email used earlier in the batch
+            _row('erin', password_confirm='mismatch'),     # fails validation
+            _row('frank', phone_number='+256700000001'),
+            _row('gina', phone_number='+256700000001'),    # phone used earlier in the batch
+        ]
+
+        response = self.client.post(self.url, rows, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([u['username'] for u in response.data['created']], ['carol', 'frank'])
+        errors = response.data['errors']
+        self.assertEqual(sorted(errors), [1, 2, 3, 5])
+        self.assertEqual(errors[1], {'username': ['Username already taken'], 'email': ['Email already registered']})
+        self.assertEqual(errors[2], {'email': ['Email already registered']})
+        self.assertIn('non_field_errors', errors[3])
+        self.assertEqual(errors[5], {'phone_number': ['Phone number already registered']})
+        self.assertFalse(CustomUser.objects.filter(username__in=['dave', 'erin', 'gina']).exists())
+
+    def test_all_rows_rejected_is_a_bad_request(self):
+        response = self.client.post(self.url, [_row('hank', password_confirm='nope')], format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], [])
+        self.assertFalse(CustomUser.objects.filter(username='hank').exists())
+
+    def test_batch_size_is_capped(self):
+        rows = [_row(f'user{i}') for i in range(views.BULK_REGISTER_LIMIT + 1)]
+
+        response = self.client.post(self.url, rows, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CustomUser.objects.filter(username='user0').exists())
+
+    def test_requires_staff(self):
+        self.client.force_authenticate(CustomUser.objects.create_user(username='pat', password='x'))
+
+        response = self.client.post(self.url, [_row('ivan')], format='json')
+
+        self.assertEqual(response.status_code, 403)
+
+
+class IntegrityErrorDetailTests(TestCase):
+    def test_sqlite_column_is_reported(self):
+        CustomUser.objects.create_user(username='phone_fan', password='x', phone_number='+256700000002')
+        with self.assertRaises(IntegrityError) as caught, transaction.atomic():
+            CustomUser.objects.create_user(username='phone_fan', password='x')
+
+        self.assertEqual(integrity_error_detail(caught.exception), {'username': ['Username already taken']})
+
+
+class IntegrityErrorDetailPostgresTests(SimpleTestCase):
+    def _error(self, constraint, detail):
+        message = f'duplicate key value violates unique constraint "{constraint}"\nDETAIL:  {detail}'
+        # Stand-in for the psycopg error Django chains as the cause
+        cause = Exception(message)
+        cause.diag = SimpleNamespace(constraint_name=constraint)
+        exc = IntegrityError(message)
+        exc.__cause__ = cause
+        return exc
+
+    def test_constraint_name_wins_over_submitted_values(self):
+        exc = self._error(
+            'authsystem_customuser_username_key',
+            'Key (username)=(email_phone_number) already exists.'
+        )
+        self.assertEqual(integrity_error_detail(exc), {'username': ['Username already taken']})
+
+    def test_phone_number_and_license_constraints(self):
+        phone = self._error('authsystem_customuser_phone_number_key', 'Key (phone_number)=(+256700000003) already exists.')
+        license = self._error('authsystem_doctorprofile_license_number_a1b2c3d4_uniq', 'Key (license_number)=(username) already exists.')
+
+        self.assertEqual(integrity_error_detail(phone), {'phone_number': ['Phone number already registered']})
+        self.assertEqual(integrity_error_detail(license), {'license_number': ['License number already registered']})
+
+    def test_unknown_constraint(self):
+        exc = self._error('authsystem_customuser_pkey', 'Key (id)=(1) already exists.')
+        self.assertEqual(integrity_error_detail(exc), {'non_field_errors': ['Account details already registered']})
+
+
+class SendSmsTests(SimpleTestCase):
+    @override_settings(DEBUG=False)
+    def test_one_time_code_is_not_logged(self):
+        with self.assertLogs('authsystem.sms', level='DEBUG') as logs:
+            sms.send_sms('+256700000004', 'OTP for +256700000004: 123456')
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertNotIn('123456', logs.output[0])
+        self.assertNotIn('+256700000004', logs.output[0])
+
+    @override_settings(DEBUG=True)
+    def test_console_delivery_in_debug(self):
+        with mock.patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            sms.send_sms('+256700000004', 'OTP for +256700000004: 123456')
+
+        self.assertIn('123456', stdout.getvalue())
+
+
+class UserSummarySerializerTests(TestCase):
+    def test_declared_fields_drive_output(self):
+        user = CustomUser.objects.create_user(
+            username='summary', email='summary@example.com', password='Kampala-Clinic-42',
+            first_name='Nakato', last_name='Achieng', user_type='doctor'
+        )
+
+        data = UserSummarySerializer(user).data
+
+        self.assertEqual(list(data), UserSummarySerializer.Meta.fields)
+        self.assertEqual(data['id'], str(user.id))
+        self.assertEqual(data['full_name'], 'Nakato Achieng')
+        self.assertEqual(data['user_type_display'], dict(CustomUser.USER_TYPES)['doctor'])
+
+
+class OTPTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='otpuser', email='otp@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def request_otp(self, otp_type='phone_verification'):
+        with mock.patch.object(views, 'queue_sms') as queue_sms:
+            response = self.client.post(reverse('request-otp'), {
+                'otp_type': otp_type, 'phone_number': '+256700000005'
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        return queue_sms.call_args.args[1][-6:]
+
+    def verify_otp(self, code, otp_type='phone_verification'):
+        return self.client.post(reverse('verify-otp'), {
+            'otp_code': code, 'otp_type': otp_type
+        }, format='json')
+
+    def test_only_the_code_digest_is_stored(self):
+        code = self.request_otp()
+
+        otp = OTPVerification.objects.get(user=self.user)
+        self.assertEqual(bytes(otp.code_hash), hash_otp_code(code))
+        self.assertNotIn(code.encode(), bytes(otp.code_hash))
+
+    def test_code_verifies_once(self):
+        code = self.request_otp()
+
+        self.assertEqual(self.verify_otp(code).status_code, 200)
+        self.assertEqual(self.verify_otp(code).status_code, 400)
+        self.assertTrue(OTPVerification.objects.get(user=self.user).is_used)
+
+    def test_new_code_supersedes_the_previous_one(self):
+        first = self.request_otp()
+        second = self.request_otp()
+        if first == second:
+            self.skipTest('both requests drew the same code')
+
+        self.assertEqual(self.verify_otp(first).status_code, 400)
+        self.assertEqual(self.verify_otp(second).status_code, 200)
+
+    def test_wrong_code_is_rejected(self):
+        code = self.request_otp()
+        wrong = f'{(int(code) + 1) % 1_000_000:06d}'
+
+        self.assertEqual(self.verify_otp(wrong).status_code, 400)
+        self.assertEqual(self.verify_otp(code, otp_type='password_reset').status_code, 400)
+
+    def test_expired_code_counts_an_attempt(self):
+        code = self.request_otp()
+        OTPVerification.objects.filter(user=self.user).update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        response = self.verify_otp(code)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Invalid or expired OTP')
+        otp = OTPVerification.objects.get(user=self.user)
+        self.assertEqual(otp.attempts, 1)
+        self.assertFalse(otp.is_used)
+
+    def test_code_locked_after_max_attempts(self):
+        code = self.request_otp()
+        OTPVerification.objects.filter(user=self.user).update(attempts=3)
+
+        self.assertEqual(self.verify_otp(code).status_code, 400)
+        self.assertEqual(OTPVerification.objects.get(user=self.user).attempts, 4)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'otp': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'otp-tests'},
+})
+@mock.patch.object(otp_cache, 'OTP_CACHE_ENABLED', True)
+class OTPCacheTests(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            username='otpcache', email='otpcache@example.com', password='x'
+        )
+
+    def issue(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return views._issue_otp(self.user, 'phone_verification', '+256700000006')
+
+    def test_only_a_cached_mismatch_is_proof(self):
+        self.assertFalse(otp_cache.is_known_wrong(self.user.pk, 'phone_verification', hash_otp_code('000000')))
+
+        code = self.issue()
+        wrong = f'{(int(code) + 1) % 1_000_000:06d}'
+
+        self.assertTrue(otp_cache.is_known_wrong(self.user.pk, 'phone_verification', hash_otp_code(wrong)))
+        self.assertFalse(otp_cache.is_known_wrong(self.user.pk, 'phone_verification', hash_otp_code(code)))
+
+    def test_forgotten_after_use(self):
+        self.issue()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            otp_cache.forget_otp(self.user.pk, 'phone_verification')
+
+        self.assertFalse(otp_cache.is_known_wrong(self.user.pk, 'phone_verification', hash_otp_code('000000')))
+
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+@mock.patch.object(audit_queue.writer, 'start', lambda: None)
+class LoginAttemptQueueTests(TestCase):
+    def setUp(self):
+        CustomUser.objects.create_user(username='queued', email='queued@example.com', password='Kampala-Clinic-42')
+
+    def login(self, password):
+        # api/auth/login/ is routed to simplejwt ahead of this app's URLs,
+        # so call LoginView directly
+        request = APIRequestFactory().post('/api/auth/login/', {
+            'username': 'queued', 'password': password
+        }, format='json', HTTP_USER_AGENT='Mozilla/5.0 ' + 'x' * 600)
+        return views.LoginView.as_view()(request)
+
+    def test_attempts_are_written_when_flushed(self):
+        with mock.patch.object(audit_queue.writer, 'queue', queue.Queue(maxsize=10)):
+            self.assertEqual(self.login('Kampala-Clinic-42').status_code, 200)
+            self.assertEqual(self.login('wrong').status_code, 400)
+            self.assertEqual(LoginAttempt.objects.count(), 0)
+
+            audit_queue.flush()
+
+        self.assertEqual(
+            sorted(LoginAttempt.objects.values_list('attempt_type', flat=True)),
+            ['failed_password', 'success']
+        )
+        attempt = LoginAttempt.objects.first()
+        self.assertEqual(len(attempt.user_agent), 512)
+        self.assertEqual(bytes(attempt.user_agent_hash), LoginAttempt.hash_user_agent('Mozilla/5.0 ' + 'x' * 600))
+
+    def test_full_queue_saves_on_calling_thread(self):
+        with mock.patch.object(audit_queue.writer, 'queue', queue.Queue(maxsize=1)):
+            for _ in range(3):
+                self.login('wrong')
+            self.assertEqual(LoginAttempt.objects.count(), 2)
+
+            audit_queue.flush()
+
+        self.assertEqual(LoginAttempt.objects.count(), 3)
+
+    def test_failed_batch_insert_falls_back_to_single_saves(self):
+        with mock.patch.object(audit_queue.writer, 'queue', queue.Queue(maxsize=10)):
+            self.login('wrong')
+            self.login('wrong')
+            with mock.patch.object(
+                LoginAttempt.objects, 'bulk_create', side_effect=DatabaseError('locked')
+            ):
+                audit_queue.flush()
+
+        self.assertEqual(LoginAttempt.objects.count(), 2)
+        self.assertTrue(all(len(attempt.user_agent) == 512 for attempt in LoginAttempt.objects.all()))
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Moves the authsystem app between migrations; the latest state is restored afterwards"""
+
+    def migrate(self, name):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('authsystem', name)])
+        return executor.loader.project_state([('authsystem', name)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class OTPCodeHashMigrationTests(MigrationTestCase):
+    def test_existing_codes_are_hashed(self):
+        apps = self.migrate('0002_otpverification_authsystem__user_id_bd2df5_idx_and_more')
+        User = apps.get_model('authsystem', 'CustomUser')
+        OTP = apps.get_model('authsystem', 'OTPVerification')
+        user = User.objects.create(username='legacy', email='legacy@example.com', verification_code='654321')
+        otp = OTP.objects.create(
+            user=user, otp_type='phone_verification', phone_number='+256700000007',
+            code='123456', expires_at=timezone.now() + timedelta(minutes=10)
+        )
+        User.objects.create(username='unverified', email='unverified@example.com')
+
+        apps = self.migrate('0003_otp_code_hash')
+        User = apps.get_model('authsystem', 'CustomUser')
+        OTP = apps.get_model('authsystem', 'OTPVerification')
+        self.assertEqual(bytes(OTP.objects.get(pk=otp.pk).code_hash), hash_otp_code('123456'))
+        self.assertEqual(bytes(User.objects.get(username='legacy').verification_code_hash), hash_otp_code('654321'))
+        self.assertEqual(bytes(User.objects.get(username='unverified').verification_code_hash), b'')
+
+        # Digests can't be reversed, so going back only restores the columns
+        apps = self.migrate('0002_otpverification_authsystem__user_id_bd2df5_idx_and_more')
+        OTP = apps.get_model('authsystem', 'OTPVerification')
+        self.assertEqual(OTP.objects.get(pk=otp.pk).code, '')
+
+
+class UserAgentHashMigrationTests(MigrationTestCase):
+    def test_long_agents_are_capped_and_hashed(self):
+        apps = self.migrate('0003_otp_code_hash')
+        Attempt = apps.get_model('authsystem', 'LoginAttempt')
+        long_agent = 'Mozilla/5.0 ' + 'x' * 1000
+        Attempt.objects.create(username='a', ip_address='10.0.0.1', user_agent=long_agent, attempt_type='success')
+        Attempt.objects.create(username='b', ip_address='10.0.0.2', user_agent='', attempt_type='failed')
+
+        apps = self.migrate('0004_loginattempt_user_agent_hash_and_more')
+        Attempt = apps.get_model('authsystem', 'LoginAttempt')
+        capped = Attempt.objects.get(username='a')
+        self.assertEqual(capped.user_agent, long_agent[:512])
+        self.assertEqual(bytes(capped.user_agent_hash), LoginAttempt.hash_user_agent(long_agent))
+        self.assertEqual(bytes(Attempt.objects.get(username='b').user_agent_hash), LoginAttempt.hash_user_agent(''))
+
+        apps = self.migrate('0003_otp_code_hash')
+        Attempt = apps.get_model('authsystem', 'LoginAttempt')
+        self.assertEqual(Attempt.objects.get(username='a').user_agent, long_agent[:512])
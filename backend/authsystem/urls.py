@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     # User registration and authentication
     path('register/', views.RegisterView.as_view(), name='register'),
+    path('register/bulk/', views.BulkRegisterView.as_view(), name='bulk-register'),
     path('login/', views.LoginView.as_view(), name='login'),
     path('verify-phone/', views.VerifyPhoneView.as_view(), name='verify-phone'),
     path('profile/', views.UserProfileView.as_view(), name='user-profile'),
@@ -2,24 +2,93 @@ from rest_framework import generics, status, permissions
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.contrib.auth import get_user_model, authenticate
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.db.models import F, Q
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from datetime import timedelta
-import random
-import string
+import secrets
 
-from .models import CustomUser, UserProfile, DoctorProfile, LoginAttempt, OTPVerification
+import msgspec
+
+from .models import CustomUser, UserProfile, DoctorProfile, LoginAttempt, OTPVerification, hash_otp_code
+from .audit_queue import enqueue_login_attempt
+from .sms import queue_sms
+from .otp_cache import remember_otp, is_known_wrong, forget_otp
 from .serializers import (
     UserRegistrationSerializer, UserProfileSerializer, 
     DoctorProfileSerializer, DoctorRegistrationSerializer,
     OTPRequestSerializer, OTPVerificationSerializer,
     PasswordResetSerializer, PasswordResetConfirmSerializer,
-    UserSummarySerializer
+    UserSummarySerializer, integrity_error_detail, find_batch_conflicts
 )
 from rest_framework_simplejwt.tokens import RefreshToken
 
-User = get_user_model()
+# Every row runs the password hasher inside the request, so batches stay
+# small enough to finish well within a worker timeout
+BULK_REGISTER_LIMIT = 50
+
+class LoginUser(msgspec.Struct):
+    id: str
+    username: str
+    email: str
+    first_name: str
+    last_name: str
+    user_type: str
+
+class LoginResponse(msgspec.Struct):
+    access: str
+    refresh: str
+    user: LoginUser
+
+class RegisterResponse(msgspec.Struct):
+    message: str
+    user_id: str
+    username: str
+    requires_phone_verification: bool
+
+class DoctorRegisterResponse(msgspec.Struct):
+    message: str
+    user_id: str
+    username: str
+
+_json_encoder = msgspec.json.Encoder()
+
+def _json_response(payload, status=200):
+    """Encode a fixed-shape success payload, bypassing DRF's renderer"""
+    return HttpResponse(_json_encoder.encode(payload), content_type='application/json', status=status)
+
+# Columns LoginView needs to check the password and build its response
+LOGIN_USER_FIELDS = (
+    'id', 'username', 'email', 'password', 'first_name',
+    'last_name', 'user_type', 'is_active'
+)
+
+def _gen_otp() -> str:
+    """Generate a 6-digit OTP code from the OS CSPRNG"""
+    return f"{secrets.randbelow(1_000_000):06d}"
+
+def _issue_otp(user, otp_type, phone_number, minutes=10):
+    """Create an OTP record and return the plaintext code to send"""
+    otp_code = _gen_otp()
+    
+    with transaction.atomic():
+        # A new code supersedes any earlier unused one for the same purpose
+        OTPVerification.objects.filter(
+            user=user, otp_type=otp_type, is_used=False
+        ).update(is_used=True)
+        
+        otp = OTPVerification.objects.create(
+            user=user,
+            otp_type=otp_type,
+            phone_number=phone_number,
+            code_hash=hash_otp_code(otp_code),
+            expires_at=timezone.now() + timedelta(minutes=minutes)
+        )
+        remember_otp(otp)
+    
+    return otp_code
 
 class RegisterView(APIView):
     """
@@ -31,42 +100,113 @@ class RegisterView(APIView):
         serializer = UserRegistrationSerializer(data=request.data)
         
         if serializer.is_valid():
-            user = serializer.save()
-            
-            # Create user profile
-            UserProfile.objects.create(user=user)
-            
-            # Send OTP for phone verification if phone number provided
             phone_number = serializer.validated_data.get('phone_number')
-            if phone_number:
-                self._send_verification_otp(user, phone_number)
             
-            return Response({
-                'message': 'User registered successfully',
-                'user_id': str(user.id),
-                'username': user.username,
-                'requires_phone_verification': bool(phone_number)
-            }, status=status.HTTP_201_CREATED)
+            # User, profile and OTP commit together
+            try:
+                with transaction.atomic():
+                    user = serializer.save()
+                    
+                    # Create user profile
+                    UserProfile.objects.create(user=user)
+                    
+                    # Send OTP for phone verification if phone number provided
+                    if phone_number:
+                        self._send_verification_otp(user, phone_number)
+            except IntegrityError as e:
+                # Lost a race with a concurrent signup
+                return Response(integrity_error_detail(e), status=status.HTTP_400_BAD_REQUEST)
+            
+            return _json_response(RegisterResponse(
+                message='User registered successfully',
+                user_id=str(user.id),
+                username=user.username,
+                requires_phone_verification=bool(phone_number)
+            ), status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     def _send_verification_otp(self, user, phone_number):
         """Send OTP for phone verification"""
-        # Generate OTP
-        otp_code = ''.join(random.choices(string.digits, k=6))
+        otp_code = _issue_otp(user, 'phone_verification', phone_number)
         
-        # Create OTP record
-        OTPVerification.objects.create(
-            user=user,
-            otp_type='phone_verification',
-            phone_number=phone_number,
-            code=otp_code,
-            expires_at=timezone.now() + timedelta(minutes=10)
-        )
+        queue_sms(phone_number, f"OTP for {phone_number}: {otp_code}")
+
+def bulk_register(rows):
+    """
+    Validate and create many user accounts with their profiles
+    
+    Rows are validated individually, uniqueness is checked for the whole
+    batch in one query, and users and profiles are inserted with one
+    bulk_create each. Returns (created_users, errors) where errors maps a
+    row index to its field errors; invalid rows are skipped.
+    """
+    errors = {}
+    indexes = []
+    valid_rows = []
+    
+    for index, row in enumerate(rows):
+        serializer = UserRegistrationSerializer(data=row, context={'bulk': True})
+        if serializer.is_valid():
+            indexes.append(index)
+            valid_rows.append(serializer.validated_data)
+        else:
+            errors[index] = serializer.errors
+    
+    conflicts = find_batch_conflicts(valid_rows)
+    users = []
+    for position, attrs in enumerate(valid_rows):
+        if position in conflicts:
+            errors[indexes[position]] = conflicts[position]
+            continue
+        
+        attrs = dict(attrs)
+        password = attrs.pop('password')
+        attrs['username'] = CustomUser.normalize_username(attrs['username'])
+        attrs['email'] = CustomUser.objects.normalize_email(attrs['email'])
+        user = CustomUser(**attrs)
+        user.set_password(password)
+        users.append(user)
+    
+    if users:
+        with transaction.atomic():
+            CustomUser.objects.bulk_create(users)
+            UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+    
+    return users, dict(sorted(errors.items()))
+
+class BulkRegisterView(APIView):
+    """
+    Administrative bulk import of user accounts
+    """
+    permission_classes = [permissions.IsAdminUser]
+    
+    def post(self, request):
+        rows = request.data
+        
+        if not isinstance(rows, list) or not rows:
+            return Response({
+                'error': 'Expected a non-empty list of users'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if len(rows) > BULK_REGISTER_LIMIT:
+            return Response({
+                'error': f'At most {BULK_REGISTER_LIMIT} users per request'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            users, errors = bulk_register(rows)
+        except IntegrityError as e:
+            # A concurrent signup claimed one of the rows; nothing was created
+            return Response(integrity_error_detail(e), status=status.HTTP_400_BAD_REQUEST)
         
-        # TODO: Send SMS with OTP
-        # For development, just log it
-        print(f"OTP for {phone_number}: {otp_code}")
+        return Response({
+            'created': [
+                {'user_id': str(user.id), 'username': user.username}
+                for user in users
+            ],
+            'errors': errors
+        }, status=status.HTTP_201_CREATED if users else status.HTTP_400_BAD_REQUEST)
 
 class LoginView(APIView):
     """
@@ -83,64 +223,49 @@ class LoginView(APIView):
                 'error': 'Username/email and password are required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Try to find user by email first, then by username
-        user = None
-        if '@' in username_or_email:
-            try:
-                user = CustomUser.objects.get(email=username_or_email)
-                username = user.username
-            except CustomUser.DoesNotExist:
-                pass
-        else:
-            username = username_or_email
-        
-        # Authenticate user
-        authenticated_user = authenticate(request, username=username, password=password)
+        # Look the user up once by email or username
+        lookup = Q(email=username_or_email) if '@' in username_or_email else Q(username=username_or_email)
+        user = CustomUser.objects.filter(lookup).only(*LOGIN_USER_FIELDS).first()
         
-        if authenticated_user:
+        if user is None:
+            # Run the hasher anyway so unknown accounts take as long as wrong passwords
+            CustomUser().set_password(password)
+        elif user.is_active and user.check_password(password):
             # Generate JWT tokens
-            refresh = RefreshToken.for_user(authenticated_user)
+            refresh = RefreshToken.for_user(user)
             
             # Log successful login
-            LoginAttempt.objects.create(
-                user=authenticated_user,
+            enqueue_login_attempt(LoginAttempt(
+                username=user.username,
                 ip_address=request.META.get('REMOTE_ADDR'),
-                user_agent=request.META.get('HTTP_USER_AGENT'),
+                user_agent=request.META.get('HTTP_USER_AGENT', ''),
                 attempt_type='success'
-            )
+            ))
             
-            return Response({
-                'access': str(refresh.access_token),
-                'refresh': str(refresh),
-                'user': {
-                    'id': str(authenticated_user.id),
-                    'username': authenticated_user.username,
-                    'email': authenticated_user.email,
-                    'first_name': authenticated_user.first_name,
-                    'last_name': authenticated_user.last_name,
-                    'user_type': authenticated_user.user_type,
-                }
-            }, status=status.HTTP_200_OK)
+            return _json_response(LoginResponse(
+                access=str(refresh.access_token),
+                refresh=str(refresh),
+                user=LoginUser(
+                    id=str(user.id),
+                    username=user.username,
+                    email=user.email,
+                    first_name=user.first_name,
+                    last_name=user.last_name,
+                    user_type=user.user_type,
+                )
+            ))
         else:
             # Log failed login
-            try:
-                user_for_log = CustomUser.objects.get(
-                    username=username if '@' not in username_or_email else username_or_email
-                ) if '@' not in username_or_email else CustomUser.objects.get(email=username_or_email)
-                
-                LoginAttempt.objects.create(
-                    user=user_for_log,
-                    ip_address=request.META.get('REMOTE_ADDR'),
-                    user_agent=request.META.get('HTTP_USER_AGENT'),
-                    attempt_type='failed_password'
-                )
-            except CustomUser.DoesNotExist:
-                # User doesn't exist, log as failed username
-                pass
-            
-            return Response({
-                'error': 'Invalid credentials'
-            }, status=status.HTTP_400_BAD_REQUEST)
+            enqueue_login_attempt(LoginAttempt(
+                username=user.username,
+                ip_address=request.META.get('REMOTE_ADDR'),
+                user_agent=request.META.get('HTTP_USER_AGENT', ''),
+                attempt_type='failed_password'
+            ))
+        
+        return Response({
+            'error': 'Invalid credentials'
+        }, status=status.HTTP_400_BAD_REQUEST)
 
 class VerifyPhoneView(APIView):
     """
@@ -154,19 +279,29 @@ class VerifyPhoneView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        otp_code = serializer.validated_data['otp_code']
+        code_hash = hash_otp_code(serializer.validated_data['otp_code'])
         
-        try:
-            otp = OTPVerification.objects.get(
+        if is_known_wrong(request.user.pk, 'phone_verification', code_hash):
+            return Response({
+                'error': 'Invalid OTP code'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic():
+            otp = OTPVerification.objects.filter(
                 user=request.user,
-                code=otp_code,
+                code_hash=code_hash,
                 otp_type='phone_verification',
                 is_used=False
-            )
+            ).select_for_update(skip_locked=True).first()
+            
+            if otp is None:
+                return Response({
+                    'error': 'Invalid OTP code'
+                }, status=status.HTTP_400_BAD_REQUEST)
             
             if not otp.is_valid():
+                OTPVerification.objects.filter(pk=otp.pk).update(attempts=F('attempts') + 1)
                 otp.attempts += 1
-                otp.save()
                 
                 if otp.attempts >= otp.max_attempts:
                     return Response({
@@ -180,31 +315,28 @@ class VerifyPhoneView(APIView):
             # Mark OTP as used
             otp.is_used = True
             otp.used_at = timezone.now()
-            otp.save()
+            otp.save(update_fields=['is_used', 'used_at'])
+            forget_otp(request.user.pk, 'phone_verification')
             
             # Mark user as verified
             user = request.user
             user.is_verified = True
-            user.save()
-            
-            return Response({
-                'message': 'Phone number verified successfully'
-            })
-            
-        except OTPVerification.DoesNotExist:
-            return Response({
-                'error': 'Invalid OTP code'
-            }, status=status.HTTP_400_BAD_REQUEST)
+            user.save(update_fields=['is_verified'])
+        
+        return Response({
+            'message': 'Phone number verified successfully'
+        })
 
 class UserProfileView(generics.RetrieveUpdateAPIView):
     """
     User profile management
     """
+    queryset = UserProfile.objects.select_related('user')
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):
-        profile, created = UserProfile.objects.get_or_create(user=self.request.user)
+        profile, created = self.get_queryset().get_or_create(user=self.request.user)
         return profile
 
 class DoctorRegisterView(APIView):
@@ -217,16 +349,20 @@ class DoctorRegisterView(APIView):
         serializer = DoctorRegistrationSerializer(data=request.data)
         
         if serializer.is_valid():
-            user = serializer.save()
-            
-            # Create user profile
-            UserProfile.objects.create(user=user)
+            try:
+                with transaction.atomic():
+                    user = serializer.save()
+                    
+                    # Create user profile
+                    UserProfile.objects.create(user=user)
+            except IntegrityError as e:
+                return Response(integrity_error_detail(e), status=status.HTTP_400_BAD_REQUEST)
             
-            return Response({
-                'message': 'Doctor registered successfully. Awaiting verification.',
-                'user_id': str(user.id),
-                'username': user.username
-            }, status=status.HTTP_201_CREATED)
+            return _json_response(DoctorRegisterResponse(
+                message='Doctor registered successfully. Awaiting verification.',
+                user_id=str(user.id),
+                username=user.username
+            ), status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -234,6 +370,7 @@ class DoctorProfileView(generics.RetrieveUpdateAPIView):
     """
     Doctor profile management
     """
+    queryset = DoctorProfile.objects.select_related('user')
     serializer_class = DoctorProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
     
@@ -242,7 +379,7 @@ class DoctorProfileView(generics.RetrieveUpdateAPIView):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("Only doctors can access doctor profiles")
         
-        profile, created = DoctorProfile.objects.get_or_create(user=self.request.user)
+        profile, created = self.get_queryset().get_or_create(user=self.request.user)
         return profile
 
 class RequestOTPView(APIView):
@@ -260,20 +397,9 @@ class RequestOTPView(APIView):
         otp_type = serializer.validated_data['otp_type']
         phone_number = serializer.validated_data['phone_number']
         
-        # Generate OTP
-        otp_code = ''.join(random.choices(string.digits, k=6))
-        
-        # Create OTP record
-        OTPVerification.objects.create(
-            user=request.user,
-            otp_type=otp_type,
-            phone_number=phone_number,
-            code=otp_code,
-            expires_at=timezone.now() + timedelta(minutes=10)
-        )
+        otp_code = _issue_otp(request.user, otp_type, phone_number)
         
-        # TODO: Send SMS
-        print(f"OTP for {phone_number}: {otp_code}")
+        queue_sms(phone_number, f"OTP for {phone_number}: {otp_code}")
         
         return Response({
             'message': f'OTP sent to {phone_number}',
@@ -292,20 +418,30 @@ class VerifyOTPView(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        otp_code = serializer.validated_data['otp_code']
+        code_hash = hash_otp_code(serializer.validated_data['otp_code'])
         otp_type = serializer.validated_data.get('otp_type', 'phone_verification')
         
-        try:
-            otp = OTPVerification.objects.get(
+        if is_known_wrong(request.user.pk, otp_type, code_hash):
+            return Response({
+                'error': 'Invalid OTP code'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        with transaction.atomic():
+            otp = OTPVerification.objects.filter(
                 user=request.user,
-                code=otp_code,
+                code_hash=code_hash,
                 otp_type=otp_type,
                 is_used=False
-            )
+            ).select_for_update(skip_locked=True).first()
+            
+            if otp is None:
+                return Response({
+                    'error': 'Invalid OTP code'
+                }, status=status.HTTP_400_BAD_REQUEST)
             
             if not otp.is_valid():
+                OTPVerification.objects.filter(pk=otp.pk).update(attempts=F('attempts') + 1)
                 otp.attempts += 1
-                otp.save()
                 
                 return Response({
                     'error': 'Invalid or expired OTP'
@@ -314,17 +450,13 @@ class VerifyOTPView(APIView):
             # Mark OTP as used
             otp.is_used = True
             otp.used_at = timezone.now()
-            otp.save()
-            
-            return Response({
-                'message': 'OTP verified successfully',
-                'otp_type': otp_type
-            })
-            
-        except OTPVerification.DoesNotExist:
-            return Response({
-                'error': 'Invalid OTP code'
-            }, status=status.HTTP_400_BAD_REQUEST)
+            otp.save(update_fields=['is_used', 'used_at'])
+            forget_otp(request.user.pk, otp_type)
+        
+        return Response({
+            'message': 'OTP verified successfully',
+            'otp_type': otp_type
+        })
 
 class PasswordResetView(APIView):
     """
@@ -340,32 +472,27 @@ class PasswordResetView(APIView):
         
         username_or_phone = serializer.validated_data['username_or_phone']
         
-        # Find user by username or phone
-        try:
-            user = User.objects.get(username=username_or_phone)
-        except User.DoesNotExist:
-            try:
-                user = User.objects.get(phone_number=username_or_phone)
-            except User.DoesNotExist:
-                # Don't reveal if user exists or not
-                return Response({
-                    'message': 'If the account exists, a reset code will be sent'
-                })
+        # Find user by username or phone in one query; a username match wins
+        # if the value happens to be both someone's username and another's phone
+        candidates = list(CustomUser.objects.filter(
+            Q(username=username_or_phone) | Q(phone_number=username_or_phone)
+        ).only('id', 'username', 'phone_number')[:2])
+        user = next(
+            (c for c in candidates if c.username == username_or_phone),
+            candidates[0] if candidates else None
+        )
+        
+        if user is None:
+            # Don't reveal if user exists or not
+            return Response({
+                'message': 'If the account exists, a reset code will be sent'
+            })
         
         if user.phone_number:
             # Generate OTP for password reset
-            otp_code = ''.join(random.choices(string.digits, k=6))
-            
-            OTPVerification.objects.create(
-                user=user,
-                otp_type='password_reset',
-                phone_number=user.phone_number,
-                code=otp_code,
-                expires_at=timezone.now() + timedelta(minutes=15)
-            )
+            otp_code = _issue_otp(user, 'password_reset', user.phone_number, minutes=15)
             
-            # TODO: Send SMS
-            print(f"Password reset OTP for {user.phone_number}: {otp_code}")
+            queue_sms(user.phone_number, f"Password reset OTP for {user.phone_number}: {otp_code}")
             
             return Response({
                 'message': 'Reset code sent to your phone number'
@@ -390,14 +517,13 @@ class PasswordResetConfirmView(APIView):
         otp_code = serializer.validated_data['otp_code']
         new_password = serializer.validated_data['new_password']
         
-        try:
-            otp = OTPVerification.objects.get(
-                code=otp_code,
-                otp_type='password_reset',
-                is_used=False
-            )
+        with transaction.atomic():
+            otp = OTPVerification.objects.valid().filter(
+                code_hash=hash_otp_code(otp_code),
+                otp_type='password_reset'
+            ).select_related('user').select_for_update(skip_locked=True).first()
             
-            if not otp.is_valid():
+            if otp is None:
                 return Response({
                     'error': 'Invalid or expired reset code'
                 }, status=status.HTTP_400_BAD_REQUEST)
@@ -405,21 +531,16 @@ class PasswordResetConfirmView(APIView):
             # Update password
             user = otp.user
             user.set_password(new_password)
-            user.save()
+            user.save(update_fields=['password'])
             
             # Mark OTP as used
             otp.is_used = True
             otp.used_at = timezone.now()
-            otp.save()
-            
-            return Response({
-                'message': 'Password reset successfully'
-            })
-            
-        except OTPVerification.DoesNotExist:
-            return Response({
-                'error': 'Invalid reset code'
-            }, status=status.HTTP_400_BAD_REQUEST)
+            otp.save(update_fields=['is_used', 'used_at'])
+        
+        return Response({
+            'message': 'Password reset successfully'
+        })
 
 
 class CurrentUserView(generics.RetrieveAPIView):
@@ -0,0 +1,30 @@
+"""
+Write-behind queue for consultation access logs
+Entries are collected on a worker thread and written with bulk_create;
+when the queue is full or a batch insert fails they are saved directly
+"""
+
+from django.db import transaction
+
+from bulamuchain.write_behind import WriteBehindQueue
+
+from .models import ConsultationAccessLog
+
+writer = WriteBehindQueue(ConsultationAccessLog, name='access-log')
+
+
+def flush():
+    """Write every queued entry now"""
+    writer.flush()
+
+
+def queue_access_log(access_log):
+    """
+    Queue an unsaved ConsultationAccessLog for writing
+
+    The entry is queued once the current transaction commits, so a rolled
+    back request never logs access to a record that does not exist. When
+    the queue is full the entry is saved on the calling thread instead.
+    """
+    writer.start()
+    transaction.on_commit(lambda: writer.put(access_log))
@@ -3,22 +3,75 @@ Consultation Blockchain Service
 Handles hashing and storing consultation data on blockchain
 """
 import hashlib
+import ipaddress
 import json
 import logging
 from datetime import datetime, timedelta
 from django.utils import timezone
-from django.conf import settings
-from cryptography.fernet import Fernet
-import secrets
+from django.db import transaction
+
+import msgspec
 
 from .models import (
     ConsultationBlockchainRecord, HealthcareProviderAccess,
     ConsultationAccessLog, BlockchainTransaction
 )
 from .services import BlockchainNetworkService
+from .access_log import queue_access_log
 
 logger = logging.getLogger(__name__)
 
+# Hashes are BLAKE2b-256, personalised per field so the digests are
+# domain-separated. Version 2 canonicalises the consultation as sorted-key
+# MessagePack with the UUIDs as their 16 raw bytes; version 1 records
+# (SHA-256 over json.dumps text) are still verified with the legacy scheme
+HASH_VERSION = 2
+
+_msgpack_encoder = msgspec.msgpack.Encoder(order='sorted')
+
+# Consultation columns read by hash_consultation; bulk callers load only these
+HASHED_CONSULTATION_FIELDS = (
+    'id', 'patient_id', 'symptoms_text', 'ai_response', 'severity_score',
+    'emergency_detected', 'language', 'created_at', 'consultation_type',
+)
+
+_HASH_PERSONS = {
+    'consultation': b'bulamu-consult',
+    'symptoms': b'bulamu-symptoms',
+    'ai_response': b'bulamu-airesp',
+    'encryption_key': b'bulamu-enckey',
+}
+
+# Pre-initialised states; copying one is cheaper than a fresh personalised init
+_HASHERS = {
+    field: hashlib.blake2b(digest_size=32, person=person)
+    for field, person in _HASH_PERSONS.items()
+}
+
+def _lock_row(instance):
+    # Hold a row lock on instance until the surrounding transaction ends
+    type(instance).objects.select_for_update().filter(pk=instance.pk).values_list('pk', flat=True).first()
+
+def _blake2b_hex(data, field):
+    h = _HASHERS[field].copy()
+    h.update(data)
+    return h.hexdigest()
+
+def _canonical_bytes(data):
+    return _msgpack_encoder.encode(data)
+
+def _canonical_inputs(consultation, consultation_data):
+    # Every hash input, built from the one consultation_data read
+    patient_id = consultation.patient_id.bytes
+    return {
+        'consultation': _canonical_bytes(
+            dict(consultation_data, consultation_id=consultation.id.bytes, patient_id=patient_id)
+        ),
+        'symptoms': consultation_data['symptoms'].encode(),
+        'ai_response': consultation_data['ai_response'].encode(),
+        'encryption_key': patient_id + consultation_data['created_at'].encode(),
+    }
+
 class ConsultationBlockchainService:
     """
     Service to handle consultation blockchain operations
@@ -26,9 +79,8 @@ class ConsultationBlockchainService:
     
     def __init__(self):
         self.blockchain_service = BlockchainNetworkService()
-        self.encryption_key = self._get_encryption_key()
     
-    def hash_consultation(self, consultation):
+    def hash_consultation(self, consultation, version=HASH_VERSION):
         """
         Create blockchain hash for consultation data
         """
@@ -36,7 +88,7 @@ class ConsultationBlockchainService:
             # Create consultation data structure for hashing
             consultation_data = {
                 'consultation_id': str(consultation.id),
-                'patient_id': str(consultation.patient.id),
+                'patient_id': str(consultation.patient_id),
                 'symptoms': consultation.symptoms_text,
                 'ai_response': consultation.ai_response,
                 'severity_score': consultation.severity_score,
@@ -46,81 +98,103 @@ class ConsultationBlockchainService:
                 'consultation_type': consultation.consultation_type
             }
             
-            # Create individual hashes
-            symptoms_hash = self._create_hash(consultation.symptoms_text)
-            ai_response_hash = self._create_hash(consultation.ai_response)
-            
-            # Create master consultation hash
-            consultation_json = json.dumps(consultation_data, sort_keys=True)
-            consultation_hash = self._create_hash(consultation_json)
+            if version == 1:
+                return self._legacy_hash_consultation(consultation, consultation_data)
             
-            # Create encryption key hash (for audit purposes)
-            encryption_key_hash = self._create_hash(str(consultation.patient.id) + str(consultation.created_at))
-            
-            return {
-                'consultation_hash': consultation_hash,
-                'symptoms_hash': symptoms_hash,
-                'ai_response_hash': ai_response_hash,
-                'encryption_key_hash': encryption_key_hash,
-                'data': consultation_data
+            # Master, per-field and encryption key (audit) hashes
+            hash_data = {
+                f'{field}_hash': _blake2b_hex(data, field)
+                for field, data in _canonical_inputs(consultation, consultation_data).items()
             }
+            hash_data['data'] = consultation_data
+            return hash_data
             
         except Exception as e:
             logger.error(f"Error hashing consultation {consultation.id}: {str(e)}")
             raise
     
+    def hash_consultations_bulk(self, consultations, version=HASH_VERSION):
+        """
+        Hash many consultations in one pass (audits, reconciliation)
+        
+        Returns a dict of consultation id -> hash data as from hash_consultation.
+        Only the patient id is read, so no per-row patient query is issued.
+        """
+        hash_consultation = self.hash_consultation
+        return {
+            consultation.id: hash_consultation(consultation, version=version)
+            for consultation in consultations
+        }
+    
+    def _legacy_hash_consultation(self, consultation, consultation_data):
+        """
+        Version 1 hashes, kept so records stored before version 2 still verify
+        """
+        consultation_json = json.dumps(consultation_data, sort_keys=True)
+        
+        # str(created_at), not isoformat(): these must match what was stored
+        return {
+            'consultation_hash': self._create_hash(consultation_json.encode()),
+            'symptoms_hash': self._create_hash(consultation.symptoms_text.encode()),
+            'ai_response_hash': self._create_hash(consultation.ai_response.encode()),
+            'encryption_key_hash': self._create_hash(
+                f"{consultation.patient_id}{consultation.created_at}".encode()
+            ),
+            'data': consultation_data
+        }
+    
     def store_consultation_on_blockchain(self, consultation):
         """
         Store consultation hash on blockchain and create blockchain record
         """
         try:
-            # Check if already stored
-            existing_record = ConsultationBlockchainRecord.objects.filter(
-                consultation=consultation
-            ).first()
-            
-            if existing_record and existing_record.stored_on_blockchain:
-                logger.info(f"Consultation {consultation.id} already stored on blockchain")
-                return existing_record
-            
-            # Generate hashes
-            hash_data = self.hash_consultation(consultation)
-            
-            # Encrypt consultation data (optional, for sensitive data)
-            encrypted_data = self._encrypt_consultation_data(hash_data['data'])
-            
-            # Create blockchain transaction
-            tx_hash = self.blockchain_service.create_blockchain_transaction(
-                'medical_record',
-                hash_data['consultation_hash']
-            )
-            
-            # Get blockchain transaction record
-            blockchain_transaction = BlockchainTransaction.objects.filter(
-                transaction_hash=tx_hash
-            ).first()
-            
-            # Create or update consultation blockchain record
-            if existing_record:
-                consultation_record = existing_record
-                consultation_record.consultation_hash = hash_data['consultation_hash']
-                consultation_record.symptoms_hash = hash_data['symptoms_hash']
-                consultation_record.ai_response_hash = hash_data['ai_response_hash']
-                consultation_record.encryption_key_hash = hash_data['encryption_key_hash']
-                consultation_record.blockchain_transaction = blockchain_transaction
-                consultation_record.stored_on_blockchain = True
-                consultation_record.save()
-            else:
-                consultation_record = ConsultationBlockchainRecord.objects.create(
+            with transaction.atomic():
+                # Concurrent stores of one consultation queue here, so only
+                # the first submits to the chain
+                _lock_row(consultation)
+                
+                # Check if already stored
+                existing_record = ConsultationBlockchainRecord.objects.filter(
+                    consultation=consultation
+                ).first()
+                
+                if existing_record and existing_record.stored_on_blockchain:
+                    logger.info(f"Consultation {consultation.id} already stored on blockchain")
+                    return existing_record
+                
+                # Generate hashes
+                hash_data = self.hash_consultation(consultation)
+                
+                # Create blockchain transaction, reusing one already submitted
+                # for this hash by an earlier attempt
+                blockchain_transaction = self._submitted_transaction(
+                    'medical_record', hash_data['consultation_hash']
+                ) or self.blockchain_service.create_blockchain_transaction(
+                    'medical_record',
+                    hash_data['consultation_hash'],
+                    idempotent=True
+                )
+                
+                # Create or update consultation blockchain record; the upsert
+                # keys on the one-to-one consultation, so concurrent stores can't
+                # both insert
+                record_fields = {
+                    'consultation_hash': hash_data['consultation_hash'],
+                    'symptoms_hash': hash_data['symptoms_hash'],
+                    'ai_response_hash': hash_data['ai_response_hash'],
+                    'encryption_key_hash': hash_data['encryption_key_hash'],
+                    'hash_version': HASH_VERSION,
+                    'blockchain_transaction': blockchain_transaction,
+                    'stored_on_blockchain': True
+                }
+                consultation_record, _ = ConsultationBlockchainRecord.objects.update_or_create(
                     consultation=consultation,
-                    patient=consultation.patient,
-                    consultation_hash=hash_data['consultation_hash'],
-                    symptoms_hash=hash_data['symptoms_hash'],
-                    ai_response_hash=hash_data['ai_response_hash'],
-                    encryption_key_hash=hash_data['encryption_key_hash'],
-                    blockchain_transaction=blockchain_transaction,
-                    stored_on_blockchain=True,
-                    encrypted=True
+                    defaults=record_fields,
+                    create_defaults={
+                        **record_fields,
+                        'patient_id': consultation.patient_id,
+                        'encrypted': True
+                    }
                 )
             
             logger.info(f"Consultation {consultation.id} stored on blockchain with hash {consultation_record.consultation_hash}")
@@ -135,67 +209,70 @@ class ConsultationBlockchainService:
         Grant healthcare provider access to patient's consultation blockchain record
         """
         try:
-            # Check if access already exists
-            existing_access = HealthcareProviderAccess.objects.filter(
-                patient=patient,
-                healthcare_provider=healthcare_provider,
-                consultation_record=consultation_record
-            ).first()
-            
-            if existing_access and existing_access.access_status == 'approved':
-                logger.info(f"Access already granted to {healthcare_provider.username} for consultation {consultation_record.consultation.id}")
-                return existing_access
-            
-            # Create expiration date
-            expires_at = timezone.now() + timedelta(days=expires_in_days)
-            
-            # Create access grant hash
-            access_data = {
-                'patient_id': str(patient.id),
-                'provider_id': str(healthcare_provider.id),
-                'consultation_hash': consultation_record.consultation_hash,
-                'access_level': access_level,
-                'purpose': purpose,
-                'granted_at': timezone.now().isoformat(),
-                'expires_at': expires_at.isoformat()
-            }
-            access_grant_hash = self._create_hash(json.dumps(access_data, sort_keys=True))
-            
-            # Create blockchain transaction for access grant
-            tx_hash = self.blockchain_service.create_blockchain_transaction(
-                'access_grant',
-                access_grant_hash
-            )
-            
-            # Get blockchain transaction record
-            blockchain_transaction = BlockchainTransaction.objects.filter(
-                transaction_hash=tx_hash
-            ).first()
-            
-            # Create or update access record
-            if existing_access:
-                access_record = existing_access
-                access_record.access_level = access_level
-                access_record.access_status = 'approved'
-                access_record.purpose = purpose
-                access_record.granted_at = timezone.now()
-                access_record.expires_at = expires_at
-                access_record.access_grant_hash = access_grant_hash
-                access_record.blockchain_transaction = blockchain_transaction
-                access_record.save()
-            else:
-                access_record = HealthcareProviderAccess.objects.create(
+            with transaction.atomic():
+                # Grants on one record queue here, so a repeated request
+                # can't submit a second access transaction
+                _lock_row(consultation_record)
+                
+                # Check if access already exists
+                existing_access = HealthcareProviderAccess.objects.filter(
                     patient=patient,
                     healthcare_provider=healthcare_provider,
-                    consultation_record=consultation_record,
-                    access_level=access_level,
-                    access_status='approved',
-                    purpose=purpose,
-                    granted_at=timezone.now(),
-                    expires_at=expires_at,
-                    access_grant_hash=access_grant_hash,
-                    blockchain_transaction=blockchain_transaction
+                    consultation_record=consultation_record
+                ).first()
+                
+                if existing_access and existing_access.access_status == 'approved':
+                    logger.info(f"Access already granted to {healthcare_provider.username} for consultation {consultation_record.consultation.id}")
+                    return existing_access
+                
+                # Create expiration date
+                expires_at = timezone.now() + timedelta(days=expires_in_days)
+                
+                # Create access grant hash
+                access_data = {
+                    'patient_id': str(patient.id),
+                    'provider_id': str(healthcare_provider.id),
+                    'consultation_hash': consultation_record.consultation_hash,
+                    'access_level': access_level,
+                    'purpose': purpose,
+                    'granted_at': timezone.now().isoformat(),
+                    'expires_at': expires_at.isoformat()
+                }
+                access_grant_hash = self._create_hash(_canonical_bytes(access_data))
+                
+                # Create blockchain transaction for access grant
+                blockchain_transaction = self.blockchain_service.create_blockchain_transaction(
+                    'access_grant',
+                    access_grant_hash
                 )
+                
+                # Create or update access record
+                if existing_access:
+                    access_record = existing_access
+                    access_record.access_level = access_level
+                    access_record.access_status = 'approved'
+                    access_record.purpose = purpose
+                    access_record.granted_at = timezone.now()
+                    access_record.expires_at = expires_at
+                    access_record.access_grant_hash = access_grant_hash
+                    access_record.blockchain_transaction = blockchain_transaction
+                    access_record.save(update_fields=[
+                        'access_level', 'access_status', 'purpose', 'granted_at',
+                        'expires_at', 'access_grant_hash', 'blockchain_transaction', 'updated_at'
+                    ])
+                else:
+                    access_record = HealthcareProviderAccess.objects.create(
+                        patient=patient,
+                        healthcare_provider=healthcare_provider,
+                        consultation_record=consultation_record,
+                        access_level=access_level,
+                        access_status='approved',
+                        purpose=purpose,
+                        granted_at=timezone.now(),
+                        expires_at=expires_at,
+                        access_grant_hash=access_grant_hash,
+                        blockchain_transaction=blockchain_transaction
+                    )
             
             logger.info(f"Access granted to {healthcare_provider.username} for consultation {consultation_record.consultation.id}")
             return access_record
@@ -240,6 +317,9 @@ class ConsultationBlockchainService:
     def log_consultation_access(self, consultation_record, accessed_by, request, provider_access=None):
         """
         Log access to consultation blockchain record
+        
+        The log is written in the background; the returned entry gets its id
+        once that write has happened.
         """
         try:
             # Determine access type
@@ -251,7 +331,7 @@ class ConsultationBlockchainService:
                 access_type = 'emergency'
             
             # Create access log
-            access_log = ConsultationAccessLog.objects.create(
+            access_log = ConsultationAccessLog(
                 consultation_record=consultation_record,
                 accessed_by=accessed_by,
                 provider_access=provider_access,
@@ -260,6 +340,7 @@ class ConsultationBlockchainService:
                 user_agent=request.META.get('HTTP_USER_AGENT', ''),
                 access_verified_on_blockchain=False  # Can be updated later with blockchain verification
             )
+            queue_access_log(access_log)
             
             logger.info(f"Access logged for consultation {consultation_record.consultation.id} by {accessed_by.username}")
             return access_log
@@ -276,7 +357,7 @@ class ConsultationBlockchainService:
             return ConsultationBlockchainRecord.objects.filter(
                 patient=patient,
                 stored_on_blockchain=True
-            ).order_by('-created_at')
+            ).select_related('consultation', 'patient').order_by('-created_at')
             
         except Exception as e:
             logger.error(f"Error getting patient consultation records: {str(e)}")
@@ -288,13 +369,16 @@ class ConsultationBlockchainService:
         """
         try:
             # Get all approved accesses for this provider
-            approved_accesses = HealthcareProviderAccess.objects.filter(
+            approved_record_ids = HealthcareProviderAccess.objects.filter(
                 healthcare_provider=healthcare_provider,
                 access_status='approved',
                 expires_at__gt=timezone.now()
-            ).select_related('consultation_record')
+            ).values_list('consultation_record_id', flat=True)
             
-            return [access.consultation_record for access in approved_accesses]
+            # Runs as one query with the access filter as a subquery
+            return ConsultationBlockchainRecord.objects.filter(
+                id__in=approved_record_ids
+            ).select_related('consultation', 'patient').order_by('-created_at')
             
         except Exception as e:
             logger.error(f"Error getting provider accessible records: {str(e)}")
@@ -315,7 +399,7 @@ class ConsultationBlockchainService:
             if access_record:
                 access_record.access_status = 'revoked'
                 access_record.revoked_at = timezone.now()
-                access_record.save()
+                access_record.save(update_fields=['access_status', 'revoked_at', 'updated_at'])
                 
                 logger.info(f"Access revoked for {healthcare_provider.username} to consultation {consultation_record.consultation.id}")
                 return True
@@ -332,8 +416,13 @@ class ConsultationBlockchainService:
         Verify consultation data integrity using blockchain hash
         """
         try:
-            # Rehash current consultation data
-            current_hash_data = self.hash_consultation(consultation_record.consultation)
+            # Rehash current consultation data with the scheme it was stored
+            # under; the row can change without touching updated_at, so
+            # nothing here is cached
+            current_hash_data = self.hash_consultation(
+                consultation_record.consultation,
+                version=consultation_record.hash_version
+            )
             
             # Compare with stored hash
             integrity_verified = (
@@ -356,46 +445,20 @@ class ConsultationBlockchainService:
                 'message': f'Integrity verification failed: {str(e)}'
             }
     
-    def _create_hash(self, data):
-        """
-        Create SHA-256 hash of data
-        """
-        return hashlib.sha256(str(data).encode()).hexdigest()
-    
-    def _get_encryption_key(self):
+    def _submitted_transaction(self, transaction_type, data_hash):
         """
-        Get or create encryption key for consultation data
+        Transaction already sent for this data hash, if any (idempotency key)
         """
-        # In production, this should be stored securely
-        key = getattr(settings, 'CONSULTATION_ENCRYPTION_KEY', None)
-        if not key:
-            key = Fernet.generate_key()
-        return key
+        return BlockchainTransaction.objects.filter(
+            transaction_type=transaction_type,
+            data_hash=data_hash
+        ).exclude(status='failed').first()
     
-    def _encrypt_consultation_data(self, data):
-        """
-        Encrypt consultation data
-        """
-        try:
-            fernet = Fernet(self.encryption_key)
-            data_json = json.dumps(data)
-            encrypted_data = fernet.encrypt(data_json.encode())
-            return encrypted_data.decode()
-        except Exception as e:
-            logger.error(f"Error encrypting consultation data: {str(e)}")
-            return None
-    
-    def _decrypt_consultation_data(self, encrypted_data):
+    def _create_hash(self, data):
         """
-        Decrypt consultation data
+        Create SHA-256 hash of data (bytes; callers encode text once)
         """
-        try:
-            fernet = Fernet(self.encryption_key)
-            decrypted_data = fernet.decrypt(encrypted_data.encode())
-            return json.loads(decrypted_data.decode())
-        except Exception as e:
-            logger.error(f"Error decrypting consultation data: {str(e)}")
-            return None
+        return hashlib.sha256(data).hexdigest()
     
     def _get_client_ip(self, request):
         """
@@ -403,7 +466,12 @@ class ConsultationBlockchainService:
         """
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
         if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0]
-        else:
-            ip = request.META.get('REMOTE_ADDR', '127.0.0.1')
-        return ip
+            # Only the first hop is needed; partition stops at the first comma
+            client_ip = x_forwarded_for.partition(',')[0].strip()
+            # The header is client-supplied; the log column only takes addresses
+            try:
+                ipaddress.ip_address(client_ip)
+                return client_ip
+            except ValueError:
+                pass
+        return request.META.get('REMOTE_ADDR', '127.0.0.1')
@@ -0,0 +1,85 @@
+"""
+Custom model fields for the blockchain app
+"""
+
+import ipaddress
+import zlib
+
+from django.db import models
+
+
+class CompressedBinaryField(models.BinaryField):
+    """
+    BinaryField stored zlib-compressed
+
+    Python code sees the raw bytes; only the database column holds the
+    compressed form. Suited to large, repetitive blobs such as contract
+    bytecode.
+    """
+
+    def __init__(self, *args, level=9, **kwargs):
+        self.level = level
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.level != 9:
+            kwargs['level'] = self.level
+        return name, path, args, kwargs
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        return zlib.compress(bytes(value), self.level)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return zlib.decompress(value)
+
+
+def _unpack_ip(value):
+    address = ipaddress.IPv6Address(bytes(value))
+    return str(address.ipv4_mapped or address)
+
+
+class PackedIPField(models.BinaryField):
+    """
+    IP address stored as 16 packed bytes
+
+    IPv4 addresses are stored IPv4-mapped, so both families share one
+    fixed-width column that orders bytewise. Python code sees the usual
+    string form, as with GenericIPAddressField.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs['max_length'] = 16
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        del kwargs['max_length']
+        return name, path, args, kwargs
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None:
+            return None
+        address = ipaddress.ip_address(value)
+        if address.version == 4:
+            address = ipaddress.IPv6Address(b'\0' * 10 + b'\xff\xff' + address.packed)
+        return address.packed
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return _unpack_ip(value)
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return _unpack_ip(value)
+        return value
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
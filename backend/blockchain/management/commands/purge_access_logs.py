@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from blockchain.models import ConsultationAccessLog
+
+
+class Command(BaseCommand):
+    help = 'Delete consultation access logs older than --days days'
+
+    def add_arguments(self, parser):
+        # No default: how long audit history is kept is a policy decision
+        parser.add_argument('--days', type=int, required=True,
+                            help='Retention period; older entries are deleted')
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Rows deleted per statement')
+
+    def handle(self, *args, **options):
+        stale = ConsultationAccessLog.objects.older_than(timedelta(days=options['days'])).order_by()
+        batch_size = options['batch_size']
+        total = 0
+
+        # One short transaction per batch; the write-behind logger keeps inserting
+        while True:
+            pks = list(stale.values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            deleted, _ = ConsultationAccessLog.objects.filter(pk__in=pks).delete()
+            total += deleted
+
+        self.stdout.write(self.style.SUCCESS(f'Purged {total} consultation access logs'))
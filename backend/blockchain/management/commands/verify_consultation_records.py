@@ -0,0 +1,67 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from blockchain.consultation_blockchain_service import (
+    ConsultationBlockchainService, HASHED_CONSULTATION_FIELDS
+)
+from blockchain.models import ConsultationBlockchainRecord
+
+
+class Command(BaseCommand):
+    help = 'Rehash stored consultations and report records whose data no longer matches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Records hashed per batch')
+
+    def handle(self, *args, **options):
+        service = ConsultationBlockchainService()
+        records = ConsultationBlockchainRecord.objects.filter(
+            stored_on_blockchain=True
+        ).select_related('consultation').only(
+            'id', 'consultation_id', 'hash_version',
+            'consultation_hash', 'symptoms_hash', 'ai_response_hash',
+            *(f'consultation__{field}' for field in HASHED_CONSULTATION_FIELDS)
+        ).order_by('pk')
+        batch_size = options['batch_size']
+        checked = 0
+        compromised = []
+
+        batch = []
+        for record in records.iterator(chunk_size=batch_size):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                compromised += self._check(service, batch)
+                checked += len(batch)
+                batch = []
+        if batch:
+            compromised += self._check(service, batch)
+            checked += len(batch)
+
+        for record in compromised:
+            self.stdout.write(self.style.WARNING(
+                f'Integrity compromised: record {record.id} (consultation {record.consultation_id})'
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f'Verified {checked} consultation records, {len(compromised)} compromised'
+        ))
+
+    def _check(self, service, records):
+        # Hash each scheme's records together
+        by_version = defaultdict(list)
+        for record in records:
+            by_version[record.hash_version].append(record)
+
+        compromised = []
+        for version, group in by_version.items():
+            hashes = service.hash_consultations_bulk(
+                [record.consultation for record in group], version=version
+            )
+            for record in group:
+                current = hashes[record.consultation_id]
+                if (current['consultation_hash'] != record.consultation_hash or
+                        current['symptoms_hash'] != record.symptoms_hash or
+                        current['ai_response_hash'] != record.ai_response_hash):
+                    compromised.append(record)
+        return compromised
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.8 on 2026-10-15 23:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0002_consultationblockchainrecord_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consultationblockchainrecord',
+            name='hash_version',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'SHA-256 (legacy)'), (2, 'BLAKE2b-256 over MessagePack')], default=1),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.8 on 2026-10-15 23:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0003_consultation_hash_version'),
+        ('consultations', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultationblockchainrecord',
+            index=models.Index(fields=['patient', 'stored_on_blockchain', '-created_at'], name='blockchain__patient_ee8968_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.8 on 2026-10-15 23:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0004_consultation_record_patient_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='healthcareprovideraccess',
+            index=models.Index(condition=models.Q(('access_status', 'approved')), fields=['healthcare_provider', 'consultation_record', 'expires_at'], name='hpa_active_idx'),
+        ),
+    ]
@@ -0,0 +1,99 @@
+# Moves ConsultationAccessLog from a UUID to a bigint primary key. A UUID
+# column can't be cast to bigint, so rows are copied into a new table which
+# then takes over the old name.
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+LOG_FIELDS = [
+    'consultation_record_id', 'accessed_by_id', 'provider_access_id',
+    'access_type', 'ip_address', 'user_agent',
+    'access_verified_on_blockchain', 'blockchain_transaction_id', 'accessed_at',
+]
+
+
+def _copy_logs(apps, source, target, **extra):
+    Source = apps.get_model('blockchain', source)
+    Target = apps.get_model('blockchain', target)
+    batch = []
+    for log in Source.objects.order_by('accessed_at').values(*LOG_FIELDS).iterator(chunk_size=2000):
+        batch.append(Target(**log, **{key: make() for key, make in extra.items()}))
+        if len(batch) >= 2000:
+            Target.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Target.objects.bulk_create(batch)
+
+
+def copy_forward(apps, schema_editor):
+    _copy_logs(apps, 'ConsultationAccessLog', 'ConsultationAccessLogNew')
+
+
+def copy_backward(apps, schema_editor):
+    _copy_logs(apps, 'ConsultationAccessLogNew', 'ConsultationAccessLog', id=uuid.uuid4)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0005_provider_access_active_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsultationAccessLogNew',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('access_type', models.CharField(choices=[('patient', 'Patient Access'), ('healthcare_provider', 'Healthcare Provider Access'), ('emergency', 'Emergency Access'), ('research', 'Research Access')], max_length=20)),
+                ('ip_address', models.GenericIPAddressField()),
+                ('user_agent', models.TextField()),
+                ('access_verified_on_blockchain', models.BooleanField(default=False)),
+                ('accessed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('accessed_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('blockchain_transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='blockchain.blockchaintransaction')),
+                ('consultation_record', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blockchain.consultationblockchainrecord')),
+                ('provider_access', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='blockchain.healthcareprovideraccess')),
+            ],
+        ),
+        migrations.RunPython(copy_forward, copy_backward),
+        migrations.DeleteModel(
+            name='ConsultationAccessLog',
+        ),
+        migrations.RenameModel(
+            old_name='ConsultationAccessLogNew',
+            new_name='ConsultationAccessLog',
+        ),
+        migrations.AlterField(
+            model_name='consultationaccesslog',
+            name='accessed_by',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consultation_accesses', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='consultationaccesslog',
+            name='blockchain_transaction',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='access_logs', to='blockchain.blockchaintransaction'),
+        ),
+        migrations.AlterField(
+            model_name='consultationaccesslog',
+            name='consultation_record',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='access_logs', to='blockchain.consultationblockchainrecord'),
+        ),
+        migrations.AlterField(
+            model_name='consultationaccesslog',
+            name='provider_access',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='blockchain.healthcareprovideraccess'),
+        ),
+        migrations.AddIndex(
+            model_name='consultationaccesslog',
+            index=models.Index(fields=['consultation_record', 'accessed_at'], name='blockchain__consult_8eb34f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultationaccesslog',
+            index=models.Index(fields=['accessed_by', 'accessed_at'], name='blockchain__accesse_632935_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.0.8 on 2026-10-15 23:23
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0006_consultation_access_log_bigint_pk'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='blockchaintransaction',
+            name='blockchain__transac_697a0b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='consultationblockchainrecord',
+            name='blockchain__consult_ba4f7c_idx',
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Moves SmartContract.bytecode from hex text to zlib-compressed bytes.
+# The hex column is kept under a temporary name while rows are converted.
+
+import blockchain.fields
+from django.db import migrations, models
+
+
+def hex_to_bytes(apps, schema_editor):
+    SmartContract = apps.get_model('blockchain', 'SmartContract')
+    for contract in SmartContract.objects.only('bytecode_hex').iterator(chunk_size=200):
+        contract.bytecode = bytes.fromhex(contract.bytecode_hex.strip().removeprefix('0x'))
+        contract.save(update_fields=['bytecode'])
+
+
+def bytes_to_hex(apps, schema_editor):
+    SmartContract = apps.get_model('blockchain', 'SmartContract')
+    for contract in SmartContract.objects.only('bytecode').iterator(chunk_size=200):
+        contract.bytecode_hex = bytes(contract.bytecode).hex()
+        contract.save(update_fields=['bytecode_hex'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0007_drop_duplicate_hash_indexes'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='smartcontract',
+            old_name='bytecode',
+            new_name='bytecode_hex',
+        ),
+        migrations.AlterField(
+            model_name='smartcontract',
+            name='bytecode_hex',
+            field=models.TextField(default=''),
+        ),
+        migrations.AddField(
+            model_name='smartcontract',
+            name='bytecode',
+            field=blockchain.fields.CompressedBinaryField(default=b''),
+            preserve_default=False,
+        ),
+        migrations.RunPython(hex_to_bytes, bytes_to_hex),
+        migrations.RemoveField(
+            model_name='smartcontract',
+            name='bytecode_hex',
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.0.8 on 2026-10-15 23:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0008_smart_contract_compressed_bytecode'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='blockchaintransaction',
+            name='blockchain__status_096a5b_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='consultationaccesslog',
+            name='blockchain__consult_8eb34f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='healthcareprovideraccess',
+            name='blockchain__healthc_7f87c0_idx',
+        ),
+        migrations.AddIndex(
+            model_name='blockchaintransaction',
+            index=models.Index(fields=['status', '-created_at'], name='blockchain__status_b228b0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consultationaccesslog',
+            index=models.Index(fields=['consultation_record', '-accessed_at', 'accessed_by', 'access_type'], name='blockchain__consult_8c0b5b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='healthcareprovideraccess',
+            index=models.Index(fields=['healthcare_provider', 'access_status', '-granted_at'], name='blockchain__healthc_2435a2_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.0.8 on 2026-10-15 23:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0009_composite_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='medicineverification',
+            name='blockchain__qr_code_bf7cd2_idx',
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Moves ConsultationAccessLog.ip_address from text to 16 packed bytes.
+# The text column is kept under a temporary name while rows are converted;
+# values that don't parse as an address are stored as '::'.
+
+import ipaddress
+
+import blockchain.fields
+from django.db import migrations, models
+
+
+def text_to_packed(apps, schema_editor):
+    ConsultationAccessLog = apps.get_model('blockchain', 'ConsultationAccessLog')
+    batch = []
+    for log in ConsultationAccessLog.objects.only('ip_address_text').iterator(chunk_size=2000):
+        try:
+            log.ip_address = str(ipaddress.ip_address(log.ip_address_text.strip()))
+        except ValueError:
+            log.ip_address = '::'
+        batch.append(log)
+        if len(batch) >= 2000:
+            ConsultationAccessLog.objects.bulk_update(batch, ['ip_address'])
+            batch = []
+    if batch:
+        ConsultationAccessLog.objects.bulk_update(batch, ['ip_address'])
+
+
+def packed_to_text(apps, schema_editor):
+    ConsultationAccessLog = apps.get_model('blockchain', 'ConsultationAccessLog')
+    batch = []
+    for log in ConsultationAccessLog.objects.only('ip_address').iterator(chunk_size=2000):
+        log.ip_address_text = log.ip_address
+        batch.append(log)
+        if len(batch) >= 2000:
+            ConsultationAccessLog.objects.bulk_update(batch, ['ip_address_text'])
+            batch = []
+    if batch:
+        ConsultationAccessLog.objects.bulk_update(batch, ['ip_address_text'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0010_drop_duplicate_qr_code_index'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='consultationaccesslog',
+            old_name='ip_address',
+            new_name='ip_address_text',
+        ),
+        migrations.AlterField(
+            model_name='consultationaccesslog',
+            name='ip_address_text',
+            field=models.GenericIPAddressField(default='::'),
+        ),
+        migrations.AddField(
+            model_name='consultationaccesslog',
+            name='ip_address',
+            field=blockchain.fields.PackedIPField(default='::'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(text_to_packed, packed_to_text),
+        migrations.RemoveField(
+            model_name='consultationaccesslog',
+            name='ip_address_text',
+        ),
+    ]
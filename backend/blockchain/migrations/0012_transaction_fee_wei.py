@@ -0,0 +1,43 @@
+# Replaces BlockchainTransaction.transaction_fee (decimal tokens) with
+# transaction_fee_wei (integer wei). The old column held up to ~1e20 wei,
+# beyond a 64-bit integer, so wei is kept in a 38-digit integral decimal.
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def tokens_to_wei(apps, schema_editor):
+    BlockchainTransaction = apps.get_model('blockchain', 'BlockchainTransaction')
+    rows = BlockchainTransaction.objects.filter(transaction_fee__isnull=False).only('transaction_fee')
+    for tx in rows.iterator(chunk_size=2000):
+        tx.transaction_fee_wei = tx.transaction_fee.scaleb(18).to_integral_value()
+        tx.save(update_fields=['transaction_fee_wei'])
+
+
+def wei_to_tokens(apps, schema_editor):
+    BlockchainTransaction = apps.get_model('blockchain', 'BlockchainTransaction')
+    rows = BlockchainTransaction.objects.filter(transaction_fee_wei__isnull=False).only('transaction_fee_wei')
+    for tx in rows.iterator(chunk_size=2000):
+        tx.transaction_fee = Decimal(tx.transaction_fee_wei).scaleb(-18)
+        tx.save(update_fields=['transaction_fee'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0011_access_log_packed_ip'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blockchaintransaction',
+            name='transaction_fee_wei',
+            field=models.DecimalField(blank=True, decimal_places=0, max_digits=38, null=True),
+        ),
+        migrations.RunPython(tokens_to_wei, wei_to_tokens),
+        migrations.RemoveField(
+            model_name='blockchaintransaction',
+            name='transaction_fee',
+        ),
+    ]
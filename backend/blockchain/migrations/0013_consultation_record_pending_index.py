@@ -0,0 +1,24 @@
+# Generated by Django 5.0.8 on 2026-10-15 23:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0012_transaction_fee_wei'),
+        ('consultations', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='consultationblockchainrecord',
+            name='blockchain__stored__0141ea_idx',
+        ),
+        migrations.AddIndex(
+            model_name='consultationblockchainrecord',
+            index=models.Index(condition=models.Q(('stored_on_blockchain', False)), fields=['created_at'], name='cbr_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.8 on 2026-10-15 23:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0013_consultation_record_pending_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consultationaccesslog',
+            index=models.Index(fields=['accessed_at'], name='blockchain__accesse_9362ac_idx'),
+        ),
+    ]
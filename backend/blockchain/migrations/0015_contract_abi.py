@@ -0,0 +1,67 @@
+# Moves SmartContract.abi into ContractABI, one row per distinct ABI.
+# The inline JSON column is kept under a temporary name while contracts
+# are pointed at their ABI row.
+
+import hashlib
+
+import django.db.models.deletion
+import orjson
+from django.db import migrations, models
+
+
+def intern_abis(apps, schema_editor):
+    ContractABI = apps.get_model('blockchain', 'ContractABI')
+    SmartContract = apps.get_model('blockchain', 'SmartContract')
+    for contract in SmartContract.objects.only('abi_json'):
+        abi_hash = hashlib.sha256(orjson.dumps(contract.abi_json, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        contract.abi, _ = ContractABI.objects.get_or_create(hash=abi_hash, defaults={'abi': contract.abi_json})
+        contract.save(update_fields=['abi'])
+
+
+def inline_abis(apps, schema_editor):
+    SmartContract = apps.get_model('blockchain', 'SmartContract')
+    for contract in SmartContract.objects.select_related('abi'):
+        contract.abi_json = contract.abi.abi
+        contract.save(update_fields=['abi_json'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blockchain', '0014_access_log_accessed_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractABI',
+            fields=[
+                ('hash', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('abi', models.JSONField()),
+            ],
+        ),
+        migrations.RenameField(
+            model_name='smartcontract',
+            old_name='abi',
+            new_name='abi_json',
+        ),
+        migrations.AlterField(
+            model_name='smartcontract',
+            name='abi_json',
+            field=models.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='smartcontract',
+            name='abi',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='contracts', to='blockchain.contractabi'),
+        ),
+        migrations.RunPython(intern_abis, inline_abis),
+        migrations.RemoveField(
+            model_name='smartcontract',
+            name='abi_json',
+        ),
+        migrations.AlterField(
+            model_name='smartcontract',
+            name='abi',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='contracts', to='blockchain.contractabi'),
+        ),
+    ]
@@ -1,7 +1,36 @@
+from datetime import date
+import hashlib
+
 from django.db import models
 from django.utils import timezone
+import orjson
 import uuid
 
+from .fields import CompressedBinaryField, PackedIPField
+
+class BlockchainTransactionQuerySet(models.QuerySet):
+    def mark_confirmed(self, block_numbers):
+        """
+        Confirm pending transactions in a single UPDATE
+        
+        block_numbers maps each transaction hash to the block it was mined
+        in. Only the status, confirmation time and block number are written;
+        for a single row, save(update_fields=[...]) does the same.
+        """
+        if not block_numbers:
+            return 0
+        return self.filter(
+            transaction_hash__in=block_numbers, status='pending'
+        ).update(
+            status='confirmed',
+            confirmed_at=timezone.now(),
+            block_number=models.Case(
+                *[models.When(transaction_hash=tx_hash, then=models.Value(block))
+                  for tx_hash, block in block_numbers.items()],
+                output_field=models.BigIntegerField()
+            )
+        )
+
 class BlockchainTransaction(models.Model):
     """
     Model to track blockchain transactions for medical records and medicine verification
@@ -33,7 +62,7 @@ class BlockchainTransaction(models.Model):
     # Gas and fees
     gas_used = models.BigIntegerField(null=True, blank=True)
     gas_price = models.BigIntegerField(null=True, blank=True)
-    transaction_fee = models.DecimalField(max_digits=20, decimal_places=18, null=True, blank=True)
+    transaction_fee_wei = models.DecimalField(max_digits=38, decimal_places=0, null=True, blank=True)  # 10**-18 of the native token
     
     # Status and metadata
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
@@ -42,17 +71,31 @@ class BlockchainTransaction(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     confirmed_at = models.DateTimeField(null=True, blank=True)
     
+    objects = BlockchainTransactionQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-created_at']
+        # transaction_hash is already indexed by its unique constraint
         indexes = [
-            models.Index(fields=['transaction_hash']),
             models.Index(fields=['data_hash']),
-            models.Index(fields=['status']),
+            models.Index(fields=['status', '-created_at']),
         ]
     
     def __str__(self):
         return f"{self.transaction_type}: {self.transaction_hash[:10]}... ({self.status})"
 
+class MedicineVerificationQuerySet(models.QuerySet):
+    def with_related(self):
+        """Join the verification transaction"""
+        return self.select_related('verification_transaction')
+    
+    def with_status(self):
+        """Annotate is_expired, with today's date taken once per query"""
+        return self.annotate(is_expired=models.ExpressionWrapper(
+            models.Q(expiry_date__lt=date.today()),
+            output_field=models.BooleanField()
+        ))
+
 class MedicineVerification(models.Model):
     """
     Model to store medicine verification data
@@ -82,14 +125,48 @@ class MedicineVerification(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     verified_at = models.DateTimeField(null=True, blank=True)
     
+    objects = MedicineVerificationQuerySet.as_manager()
+    
     class Meta:
+        # qr_code is already indexed by its unique constraint
         indexes = [
-            models.Index(fields=['qr_code']),
             models.Index(fields=['batch_number']),
         ]
     
     def __str__(self):
         return f"{self.medicine_name} - {self.batch_number} ({self.verification_status})"
+    
+    @property
+    def has_expired(self):
+        """Python-side is_expired, for instances not loaded with with_status()"""
+        return self.expiry_date < date.today()
+
+class ContractABIQuerySet(models.QuerySet):
+    def intern(self, abi):
+        """Return the stored row for ``abi``, creating it on first use"""
+        abi_hash = hashlib.sha256(orjson.dumps(abi, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        contract_abi, _ = self.get_or_create(hash=abi_hash, defaults={'abi': abi})
+        return contract_abi
+
+class ContractABI(models.Model):
+    """
+    Contract ABI stored once per distinct content
+    
+    Deployments of the same contract on several networks share one row,
+    keyed by the SHA-256 of the sorted-key JSON.
+    """
+    hash = models.CharField(max_length=64, primary_key=True)
+    abi = models.JSONField()
+    
+    objects = ContractABIQuerySet.as_manager()
+    
+    def __str__(self):
+        return f"ABI {self.hash[:10]}..."
+
+class SmartContractManager(models.Manager):
+    def get_queryset(self):
+        """Leave out the bytecode, which only deployment needs"""
+        return super().get_queryset().defer('bytecode')
 
 class SmartContract(models.Model):
     """
@@ -114,8 +191,9 @@ class SmartContract(models.Model):
     network = models.CharField(max_length=20, choices=NETWORKS)
     
     # Contract details
-    abi = models.JSONField()  # Contract ABI
-    bytecode = models.TextField()
+    # Shared between deployments; set with ContractABI.objects.intern(abi)
+    abi = models.ForeignKey(ContractABI, on_delete=models.PROTECT, related_name='contracts')
+    bytecode = CompressedBinaryField()  # Raw bytes, zlib-compressed at rest
     deployment_transaction = models.CharField(max_length=66)
     
     # Metadata
@@ -123,12 +201,30 @@ class SmartContract(models.Model):
     is_active = models.BooleanField(default=True)
     version = models.CharField(max_length=10, default='1.0')
     
+    objects = SmartContractManager()
+    # Loads every column, for code that works with the bytecode
+    full_objects = models.Manager()
+    
     class Meta:
         unique_together = ['contract_type', 'network']
     
     def __str__(self):
         return f"{self.contract_type} on {self.network}: {self.contract_address}"
 
+class PatientConsentRecordQuerySet(models.QuerySet):
+    def with_related(self):
+        """Join the patient and blockchain transaction"""
+        return self.select_related('patient', 'blockchain_transaction')
+    
+    def with_status(self):
+        """Annotate is_active: granted, not revoked and not yet expired"""
+        return self.annotate(is_active=models.Case(
+            models.When(revoked_at__isnull=False, then=models.Value(False)),
+            models.When(expires_at__lt=timezone.now(), then=models.Value(False)),
+            default=models.F('granted'),
+            output_field=models.BooleanField()
+        ))
+
 class PatientConsentRecord(models.Model):
     """
     Model to track patient consent for data sharing on blockchain
@@ -157,6 +253,8 @@ class PatientConsentRecord(models.Model):
     expires_at = models.DateTimeField(null=True, blank=True)
     revoked_at = models.DateTimeField(null=True, blank=True)
     
+    objects = PatientConsentRecordQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['patient', 'consent_type']
         indexes = [
@@ -167,7 +265,21 @@ class PatientConsentRecord(models.Model):
     def __str__(self):
         status = "Granted" if self.granted else "Denied"
         return f"{self.patient.username} - {self.consent_type}: {status}"
+    
+    @property
+    def in_effect(self):
+        """Python-side is_active, for instances not loaded with with_status()"""
+        if self.revoked_at:
+            return False
+        if self.expires_at and self.expires_at < timezone.now():
+            return False
+        return self.granted
+
 
+class ConsultationBlockchainRecordQuerySet(models.QuerySet):
+    def with_related(self):
+        """Join the patient, consultation and blockchain transaction"""
+        return self.select_related('patient', 'consultation', 'blockchain_transaction')
 
 class ConsultationBlockchainRecord(models.Model):
     """
@@ -180,6 +292,11 @@ class ConsultationBlockchainRecord(models.Model):
         ('research', 'Research Access'),
     ]
     
+    HASH_VERSIONS = [
+        (1, 'SHA-256 (legacy)'),
+        (2, 'BLAKE2b-256 over MessagePack'),
+    ]
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     consultation = models.OneToOneField('consultations.Consultation', on_delete=models.CASCADE, related_name='blockchain_record')
     patient = models.ForeignKey('authsystem.CustomUser', on_delete=models.CASCADE, related_name='consultation_blockchain_records')
@@ -188,6 +305,7 @@ class ConsultationBlockchainRecord(models.Model):
     consultation_hash = models.CharField(max_length=64, unique=True)
     symptoms_hash = models.CharField(max_length=64)
     ai_response_hash = models.CharField(max_length=64)
+    hash_version = models.PositiveSmallIntegerField(choices=HASH_VERSIONS, default=1)
     
     # Blockchain transaction details
     blockchain_transaction = models.ForeignKey(BlockchainTransaction, on_delete=models.SET_NULL, null=True, blank=True)
@@ -200,17 +318,33 @@ class ConsultationBlockchainRecord(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = ConsultationBlockchainRecordQuerySet.as_manager()
+    
     class Meta:
+        # consultation_hash is already indexed by its unique constraint
         indexes = [
-            models.Index(fields=['consultation_hash']),
             models.Index(fields=['patient']),
-            models.Index(fields=['stored_on_blockchain']),
+            models.Index(fields=['patient', 'stored_on_blockchain', '-created_at']),
+            # Records still waiting for upload; stays small as the chain catches up
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(stored_on_blockchain=False),
+                name='cbr_pending_idx'
+            ),
         ]
     
     def __str__(self):
-        return f"Blockchain Record for Consultation {self.consultation.id} - Patient: {self.patient.username}"
+        return f"Blockchain Record for Consultation {self.consultation_id} - Patient: {self.patient.username}"
 
 
+class HealthcareProviderAccessQuerySet(models.QuerySet):
+    def with_related(self):
+        """Join both parties, the consultation and blockchain transaction"""
+        return self.select_related(
+            'patient', 'healthcare_provider',
+            'consultation_record__consultation', 'blockchain_transaction'
+        )
+
 class HealthcareProviderAccess(models.Model):
     """
     Model to track healthcare provider access to patient consultation blockchain records
@@ -254,23 +388,45 @@ class HealthcareProviderAccess(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = HealthcareProviderAccessQuerySet.as_manager()
+    
     class Meta:
         unique_together = ['patient', 'healthcare_provider', 'consultation_record']
         indexes = [
             models.Index(fields=['patient', 'access_status']),
-            models.Index(fields=['healthcare_provider', 'access_status']),
+            models.Index(fields=['healthcare_provider', 'access_status', '-granted_at']),
             models.Index(fields=['access_grant_hash']),
+            # Active grants only; expiry is compared at query time
+            models.Index(
+                fields=['healthcare_provider', 'consultation_record', 'expires_at'],
+                condition=models.Q(access_status='approved'),
+                name='hpa_active_idx'
+            ),
         ]
     
     def __str__(self):
         return f"Provider Access: {self.healthcare_provider.username} -> Patient: {self.patient.username} ({self.access_status})"
 
 
+class ConsultationAccessLogQuerySet(models.QuerySet):
+    def with_related(self):
+        """Join the accessor, consultation record, grant and blockchain transaction"""
+        return self.select_related(
+            'accessed_by', 'consultation_record',
+            'provider_access', 'blockchain_transaction'
+        )
+    
+    def older_than(self, age):
+        """Entries logged more than ``age`` (a timedelta) ago"""
+        return self.filter(accessed_at__lt=timezone.now() - age)
+
 class ConsultationAccessLog(models.Model):
     """
     Model to log all accesses to consultation blockchain records
     """
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Append-only and never addressed by id, so a sequential key keeps
+    # inserts at the end of the index and foreign keys out of it small
+    id = models.BigAutoField(primary_key=True)
     
     consultation_record = models.ForeignKey(ConsultationBlockchainRecord, on_delete=models.CASCADE, related_name='access_logs')
     accessed_by = models.ForeignKey('authsystem.CustomUser', on_delete=models.CASCADE, related_name='consultation_accesses')
@@ -278,7 +434,7 @@ class ConsultationAccessLog(models.Model):
     
     # Access details
     access_type = models.CharField(max_length=20, choices=ConsultationBlockchainRecord.ACCESS_TYPES)
-    ip_address = models.GenericIPAddressField()
+    ip_address = PackedIPField()
     user_agent = models.TextField()
     
     # Blockchain verification
@@ -287,11 +443,16 @@ class ConsultationAccessLog(models.Model):
     
     accessed_at = models.DateTimeField(default=timezone.now)
     
+    objects = ConsultationAccessLogQuerySet.as_manager()
+    
     class Meta:
         indexes = [
-            models.Index(fields=['consultation_record', 'accessed_at']),
+            # Wide enough to answer the audit listing from the index alone
+            models.Index(fields=['consultation_record', '-accessed_at', 'accessed_by', 'access_type']),
             models.Index(fields=['accessed_by', 'accessed_at']),
+            # Recent-history reads and retention purges go by time alone
+            models.Index(fields=['accessed_at']),
         ]
     
     def __str__(self):
-        return f"Access by {self.accessed_by.username} to consultation {self.consultation_record.consultation.id} at {self.accessed_at}"
+        return f"Access by {self.accessed_by.username} to consultation {self.consultation_record.consultation_id} at {self.accessed_at}"
@@ -1,15 +1,39 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 from .models import (
     BlockchainTransaction, MedicineVerification, 
     SmartContract, PatientConsentRecord
 )
 
+# Choice labels for the *_display fields, shared by the model and list
+# serializers so no serializer calls get_FOO_display() per row
+_TRANSACTION_TYPES = dict(BlockchainTransaction.TRANSACTION_TYPES)
+_TRANSACTION_STATUSES = dict(BlockchainTransaction.STATUS_CHOICES)
+_VERIFICATION_STATUSES = dict(MedicineVerification.VERIFICATION_STATUS)
+_CONTRACT_TYPES = dict(SmartContract.CONTRACT_TYPES)
+_NETWORKS = dict(SmartContract.NETWORKS)
+_CONSENT_TYPES = dict(PatientConsentRecord.CONSENT_TYPES)
+
+class WeiField(serializers.Field):
+    """
+    Read-only field showing an integer wei amount in whole tokens, as a
+    decimal string with 18 places
+    """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+    
+    def to_representation(self, value):
+        return f"{Decimal(value).scaleb(-18):.18f}"
+
 class BlockchainTransactionSerializer(serializers.ModelSerializer):
     """
     Serializer for blockchain transactions
     """
-    transaction_type_display = serializers.CharField(source='get_transaction_type_display', read_only=True)
-    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    transaction_type_display = serializers.SerializerMethodField()
+    status_display = serializers.SerializerMethodField()
+    transaction_fee = WeiField(source='transaction_fee_wei')
     
     class Meta:
         model = BlockchainTransaction
@@ -21,12 +45,57 @@ class BlockchainTransactionSerializer(serializers.ModelSerializer):
             'confirmed_at'
         ]
         read_only_fields = ['id', 'created_at', 'confirmed_at']
+    
+    def get_transaction_type_display(self, obj):
+        return _TRANSACTION_TYPES.get(obj.transaction_type, obj.transaction_type)
+    
+    def get_status_display(self, obj):
+        return _TRANSACTION_STATUSES.get(obj.status, obj.status)
+
+class BlockchainTransactionListSerializer(serializers.Serializer):
+    """
+    List-mode serializer for BlockchainTransaction.objects.values(*columns)
+    
+    Reads plain dict rows, so a page is rendered without building model
+    instances; the display labels are looked up from the choices.
+    """
+    columns = (
+        'id', 'transaction_type', 'transaction_hash', 'block_number',
+        'contract_address', 'data_hash', 'gas_used', 'gas_price',
+        'transaction_fee_wei', 'status', 'error_message', 'created_at',
+        'confirmed_at'
+    )
+    
+    id = serializers.UUIDField()
+    transaction_type = serializers.CharField()
+    transaction_type_display = serializers.SerializerMethodField()
+    transaction_hash = serializers.CharField()
+    block_number = serializers.IntegerField()
+    contract_address = serializers.CharField()
+    data_hash = serializers.CharField()
+    gas_used = serializers.IntegerField()
+    gas_price = serializers.IntegerField()
+    transaction_fee = WeiField(source='transaction_fee_wei')
+    status = serializers.CharField()
+    status_display = serializers.SerializerMethodField()
+    error_message = serializers.CharField()
+    created_at = serializers.DateTimeField()
+    confirmed_at = serializers.DateTimeField()
+    
+    def get_transaction_type_display(self, row):
+        return _TRANSACTION_TYPES.get(row['transaction_type'], row['transaction_type'])
+    
+    def get_status_display(self, row):
+        return _TRANSACTION_STATUSES.get(row['status'], row['status'])
 
 class MedicineVerificationSerializer(serializers.ModelSerializer):
     """
     Serializer for medicine verification
+    
+    is_expired is read from the MedicineVerification.objects.with_status()
+    annotation when present.
     """
-    verification_status_display = serializers.CharField(source='get_verification_status_display', read_only=True)
+    verification_status_display = serializers.SerializerMethodField()
     is_expired = serializers.SerializerMethodField()
     
     class Meta:
@@ -42,9 +111,42 @@ class MedicineVerificationSerializer(serializers.ModelSerializer):
             'created_at', 'verified_at'
         ]
     
+    def get_verification_status_display(self, obj):
+        return _VERIFICATION_STATUSES.get(obj.verification_status, obj.verification_status)
+    
     def get_is_expired(self, obj):
-        from datetime import date
-        return obj.expiry_date < date.today() if obj.expiry_date else False
+        # with_status() annotates is_expired; only unannotated rows compute it
+        if hasattr(obj, 'is_expired'):
+            return obj.is_expired
+        return obj.has_expired
+
+class MedicineVerificationListSerializer(serializers.Serializer):
+    """
+    List-mode serializer for
+    MedicineVerification.objects.with_status().values(*columns)
+    """
+    columns = (
+        'id', 'medicine_name', 'batch_number', 'manufacturer',
+        'expiry_date', 'is_expired', 'qr_code', 'verification_status',
+        'blockchain_verified', 'created_at', 'verified_at'
+    )
+    
+    id = serializers.UUIDField()
+    medicine_name = serializers.CharField()
+    batch_number = serializers.CharField()
+    manufacturer = serializers.CharField()
+    expiry_date = serializers.DateField()
+    is_expired = serializers.BooleanField()
+    qr_code = serializers.CharField()
+    verification_status = serializers.CharField()
+    verification_status_display = serializers.SerializerMethodField()
+    blockchain_verified = serializers.BooleanField()
+    created_at = serializers.DateTimeField()
+    verified_at = serializers.DateTimeField()
+    
+    def get_verification_status_display(self, row):
+        status = row['verification_status']
+        return _VERIFICATION_STATUSES.get(status, status)
 
 class MedicineVerificationCreateSerializer(serializers.ModelSerializer):
     """
@@ -74,18 +176,34 @@ class QRCodeVerificationSerializer(serializers.Serializer):
     )
     
     def validate_qr_code(self, value):
-        if not value.strip():
+        value = value.strip()
+        if not value:
             raise serializers.ValidationError("QR code is required")
-        if len(value.strip()) < 5:
+        if len(value) < 5:
             raise serializers.ValidationError("Invalid QR code format")
-        return value.strip()
+        return value
+
+class BulkQRCodeVerificationSerializer(serializers.Serializer):
+    """
+    Serializer for verifying a batch of QR codes in one request
+    """
+    qr_codes = serializers.ListField(
+        child=serializers.CharField(min_length=5, max_length=500),
+        min_length=1,
+        max_length=500,
+        help_text="QR code data from up to 500 medicine packages"
+    )
+    
+    def validate_qr_codes(self, value):
+        # The same package scanned twice is verified once
+        return list(dict.fromkeys(value))
 
 class SmartContractSerializer(serializers.ModelSerializer):
     """
     Serializer for smart contracts
     """
-    contract_type_display = serializers.CharField(source='get_contract_type_display', read_only=True)
-    network_display = serializers.CharField(source='get_network_display', read_only=True)
+    contract_type_display = serializers.SerializerMethodField()
+    network_display = serializers.SerializerMethodField()
     
     class Meta:
         model = SmartContract
@@ -96,13 +214,22 @@ class SmartContractSerializer(serializers.ModelSerializer):
             'version'
         ]
         read_only_fields = ['id', 'deployed_at']
+    
+    def get_contract_type_display(self, obj):
+        return _CONTRACT_TYPES.get(obj.contract_type, obj.contract_type)
+    
+    def get_network_display(self, obj):
+        return _NETWORKS.get(obj.network, obj.network)
 
 class PatientConsentRecordSerializer(serializers.ModelSerializer):
     """
     Serializer for patient consent records
+    
+    patient_name reads the patient and is_active prefers the annotation;
+    build querysets with PatientConsentRecord.objects.with_related().with_status().
     """
     patient_name = serializers.CharField(source='patient.get_full_name', read_only=True)
-    consent_type_display = serializers.CharField(source='get_consent_type_display', read_only=True)
+    consent_type_display = serializers.SerializerMethodField()
     is_active = serializers.SerializerMethodField()
     
     class Meta:
@@ -117,19 +244,47 @@ class PatientConsentRecordSerializer(serializers.ModelSerializer):
             'id', 'patient', 'consent_hash', 'created_at'
         ]
     
+    def get_consent_type_display(self, obj):
+        return _CONSENT_TYPES.get(obj.consent_type, obj.consent_type)
+    
     def get_is_active(self, obj):
-        from django.utils import timezone
-        now = timezone.now()
-        
-        # Check if consent is revoked
-        if obj.revoked_at:
-            return False
-        
-        # Check if consent is expired
-        if obj.expires_at and obj.expires_at < now:
-            return False
-        
-        return obj.granted
+        if hasattr(obj, 'is_active'):
+            return obj.is_active
+        return obj.in_effect
+
+class PatientConsentRecordListSerializer(serializers.Serializer):
+    """
+    List-mode serializer for
+    PatientConsentRecord.objects.with_status().values(*columns)
+    
+    patient_name is built from the joined name columns the same way
+    get_full_name() does.
+    """
+    columns = (
+        'id', 'patient', 'patient__first_name', 'patient__last_name',
+        'consent_type', 'granted', 'consent_text', 'digital_signature',
+        'consent_hash', 'is_active', 'created_at', 'expires_at', 'revoked_at'
+    )
+    
+    id = serializers.UUIDField()
+    patient = serializers.ReadOnlyField()
+    patient_name = serializers.SerializerMethodField()
+    consent_type = serializers.CharField()
+    consent_type_display = serializers.SerializerMethodField()
+    granted = serializers.BooleanField()
+    consent_text = serializers.CharField()
+    digital_signature = serializers.CharField()
+    consent_hash = serializers.CharField()
+    is_active = serializers.BooleanField()
+    created_at = serializers.DateTimeField()
+    expires_at = serializers.DateTimeField()
+    revoked_at = serializers.DateTimeField()
+    
+    def get_patient_name(self, row):
+        return f"{row['patient__first_name']} {row['patient__last_name']}".strip()
+    
+    def get_consent_type_display(self, row):
+        return _CONSENT_TYPES.get(row['consent_type'], row['consent_type'])
 
 class ConsentCreateSerializer(serializers.ModelSerializer):
     """
@@ -169,7 +324,16 @@ class TransactionStatusSerializer(serializers.Serializer):
     )
     
     def validate_transaction_hash(self, value):
-        if not value.startswith('0x') or len(value) != 66:
+        # A transaction hash is 0x followed by a 32-byte digest in hex;
+        # the length check turns most bad input away before decoding
+        try:
+            valid = (
+                len(value) == 66 and value.startswith('0x')
+                and len(bytes.fromhex(value[2:])) == 32
+            )
+        except ValueError:
+            valid = False
+        if not valid:
             raise serializers.ValidationError(
                 "Invalid transaction hash format"
             )
@@ -2,27 +2,136 @@
 Blockchain and medicine verification services
 """
 import hashlib
-import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime
-from web3 import Web3
+from functools import lru_cache
+from types import MappingProxyType
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from eth_account import Account
+from web3 import HTTPProvider, Web3
 from django.conf import settings
 from .models import BlockchainTransaction, MedicineVerification
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Node and contract settings are fixed for the life of the process
+_WEB3_URL = getattr(settings, 'WEB3_PROVIDER_URL', '')
+_PRIVATE_KEY = getattr(settings, 'BLOCKCHAIN_PRIVATE_KEY', '')
+_MEDICINE_AUTH_CONTRACT_ADDRESS = getattr(settings, 'MEDICINE_AUTH_CONTRACT_ADDRESS', '')
+_MEDICAL_RECORDS_CONTRACT_ADDRESS = getattr(settings, 'MEDICAL_RECORDS_CONTRACT_ADDRESS', '')
+
+# Mock authorised-medicine register: name -> (approved manufacturers, status).
+# This would come from the actual medicine authorization database
+_AUTHORIZED_MEDICINES = MappingProxyType({
+    'paracetamol': (frozenset({'Cipla Uganda', 'Kampala Pharmaceutical'}), 'authentic'),
+    'amoxicillin': (frozenset({'Quality Chemicals', 'Medic Pharma'}), 'authentic'),
+    'chloroquine': (frozenset({'Cipla Uganda'}), 'authentic'),
+})
+
+RPC_TIMEOUT = 30
+
+
+class _PooledHTTPProvider(HTTPProvider):
+    """
+    HTTPProvider that posts through one keep-alive session
+
+    web3 keeps a session per thread, so calls made from the RPC pool would
+    each open their own connections. Connection errors are retried; reads
+    are not, since a raw transaction may already have been accepted.
+    """
+
+    def __init__(self, endpoint_uri):
+        super().__init__(endpoint_uri)
+        adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=64,
+            max_retries=Retry(total=3, read=False, backoff_factor=0.1),
+        )
+        self._session = requests.Session()
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+    def make_request(self, method, params):
+        request_kwargs = dict(self.get_request_kwargs())
+        request_kwargs.setdefault('timeout', RPC_TIMEOUT)
+        response = self._session.post(
+            self.endpoint_uri,
+            data=self.encode_rpc_request(method, params),
+            **request_kwargs
+        )
+        response.raise_for_status()
+        return self.decode_rpc_response(response.content)
+
+
+# One client per provider URL, shared by every service instance so the
+# provider's HTTP session and its pooled connections are reused
+@lru_cache(maxsize=None)
+def _web3_for(web3_url):
+    return Web3(_PooledHTTPProvider(web3_url))
+
+# Deriving the account from the key is elliptic-curve work; do it once
+@lru_cache(maxsize=None)
+def _account_for(private_key):
+    return Account.from_key(private_key)
+
+# Pharmacies rescan the same packs, so identical inputs are memoised
+@lru_cache(maxsize=4096)
+def _medicine_hash(medicine_name, batch_number, manufacturer, expiry_date):
+    # Fields are concatenated without separators; on-chain records are
+    # keyed by this exact preimage, so its layout must not change
+    preimage = b''.join((
+        medicine_name.encode(),
+        batch_number.encode(),
+        manufacturer.encode(),
+        str(expiry_date).encode(),
+    ))
+    return hashlib.sha256(preimage).digest().hex()
+
+@lru_cache(maxsize=1024)
+def _parse_date_string(date_string):
+    # YYYY-MM-DD is by far the most common; the C ISO parser skips
+    # strptime's format matching
+    if len(date_string) == 10 and date_string[4] == '-' and date_string[7] == '-':
+        try:
+            return date.fromisoformat(date_string)
+        except ValueError:
+            pass
+    
+    # Try different date formats
+    for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y']:
+        try:
+            return datetime.strptime(date_string, fmt).date()
+        except ValueError:
+            continue
+    
+    # If no format works, return None
+    return None
+
+# On-chain medicine records are immutable, so contract lookups for a hash
+# are reused for ten minutes; the oldest entry is dropped once full
+CHAIN_QUERY_TTL = 600.0
+CHAIN_QUERY_CACHE_SIZE = 10000
+_chain_query_cache = {}
+_chain_query_lock = threading.Lock()
+
 class MedicineVerificationService:
     """
     Service for verifying medicine authenticity
     """
     
     def __init__(self):
-        self.web3_url = getattr(settings, 'WEB3_PROVIDER_URL', '')
-        self.contract_address = getattr(settings, 'MEDICINE_AUTH_CONTRACT_ADDRESS', '')
+        self.web3_url = _WEB3_URL
+        self.contract_address = _MEDICINE_AUTH_CONTRACT_ADDRESS
         
         if self.web3_url:
             try:
-                self.web3 = Web3(Web3.HTTPProvider(self.web3_url))
+                self.web3 = _web3_for(self.web3_url)
             except Exception as e:
                 logger.error(f"Failed to initialize Web3: {str(e)}")
                 self.web3 = None
@@ -90,18 +199,17 @@ class MedicineVerificationService:
         try:
             # QR code format: JSON with medicine data
             if qr_code.startswith('{'):
-                return json.loads(qr_code)
+                return orjson.loads(qr_code)
             
             # QR code format: pipe-separated values
-            if '|' in qr_code:
-                parts = qr_code.split('|')
-                if len(parts) >= 4:
-                    return {
-                        'medicine_name': parts[0],
-                        'batch_number': parts[1],
-                        'manufacturer': parts[2],
-                        'expiry_date': parts[3]
-                    }
+            parts = qr_code.split('|', 4)
+            if len(parts) >= 4:
+                return {
+                    'medicine_name': parts[0],
+                    'batch_number': parts[1],
+                    'manufacturer': parts[2],
+                    'expiry_date': parts[3]
+                }
             
             # Mock parsing for development
             return self._mock_parse_qr_code(qr_code)
@@ -114,31 +222,14 @@ class MedicineVerificationService:
         """
         Check medicine against authorized database
         """
-        # This would query actual medicine authorization database
-        # For now, using mock data
-        
-        authorized_medicines = {
-            'paracetamol': {
-                'manufacturers': ['Cipla Uganda', 'Kampala Pharmaceutical'],
-                'status': 'authentic'
-            },
-            'amoxicillin': {
-                'manufacturers': ['Quality Chemicals', 'Medic Pharma'],
-                'status': 'authentic'
-            },
-            'chloroquine': {
-                'manufacturers': ['Cipla Uganda'],
-                'status': 'authentic'
-            }
-        }
-        
         medicine_name = medicine_data.get('medicine_name', '').lower()
         manufacturer = medicine_data.get('manufacturer', '')
         
-        if medicine_name in authorized_medicines:
-            auth_info = authorized_medicines[medicine_name]
+        auth_info = _AUTHORIZED_MEDICINES.get(medicine_name)
+        if auth_info:
+            manufacturers, auth_status = auth_info
             
-            if manufacturer in auth_info['manufacturers']:
+            if manufacturer in manufacturers:
                 # Parse expiry date
                 expiry_date = self._parse_date(medicine_data.get('expiry_date'))
                 
@@ -148,7 +239,7 @@ class MedicineVerificationService:
                     'batch_number': medicine_data.get('batch_number', ''),
                     'manufacturer': manufacturer,
                     'expiry_date': expiry_date,
-                    'status': auth_info['status'],
+                    'status': auth_status,
                     'message': 'Medicine verified as authentic'
                 }
             else:
@@ -171,17 +262,25 @@ class MedicineVerificationService:
         """
         Create hash for blockchain verification
         """
-        medicine_string = f"{medicine.medicine_name}{medicine.batch_number}{medicine.manufacturer}{medicine.expiry_date}"
-        return hashlib.sha256(medicine_string.encode()).hexdigest()
+        return _medicine_hash(
+            medicine.medicine_name, medicine.batch_number,
+            medicine.manufacturer, medicine.expiry_date
+        )
     
     def _query_blockchain_contract(self, medicine_hash):
         """
         Query blockchain smart contract for medicine verification
         """
+        cache_key = (self.contract_address, medicine_hash)
+        with _chain_query_lock:
+            cached = _chain_query_cache.get(cache_key)
+        if cached and time.monotonic() - cached[0] < CHAIN_QUERY_TTL:
+            return dict(cached[1])
+        
         try:
             # This would call actual smart contract method
             # For now, returning mock result
-            return {
+            result = {
                 'verified': True,
                 'message': 'Medicine hash found on blockchain'
             }
@@ -191,21 +290,31 @@ class MedicineVerificationService:
                 'verified': False,
                 'message': f'Blockchain query failed: {str(e)}'
             }
+        
+        with _chain_query_lock:
+            _chain_query_cache.pop(cache_key, None)
+            _chain_query_cache[cache_key] = (time.monotonic(), result)
+            if len(_chain_query_cache) > CHAIN_QUERY_CACHE_SIZE:
+                del _chain_query_cache[next(iter(_chain_query_cache))]
+        
+        return dict(result)
     
     def _mock_parse_qr_code(self, qr_code):
         """
         Mock QR code parsing for development
         """
-        # Generate mock medicine data based on QR code
-        qr_hash = hashlib.md5(qr_code.encode()).hexdigest()[:8]
+        # Generate mock medicine data based on QR code; one digest gives
+        # the batch number and both picks, stable across processes
+        digest = hashlib.md5(qr_code.encode()).digest()
+        pick = int.from_bytes(digest[8:16], 'big')
         
-        medicines = ['Paracetamol', 'Amoxicillin', 'Chloroquine', 'Ibuprofen']
-        manufacturers = ['Cipla Uganda', 'Quality Chemicals', 'Kampala Pharmaceutical']
+        medicines = ('Paracetamol', 'Amoxicillin', 'Chloroquine', 'Ibuprofen')
+        manufacturers = ('Cipla Uganda', 'Quality Chemicals', 'Kampala Pharmaceutical')
         
         return {
-            'medicine_name': medicines[hash(qr_code) % len(medicines)],
-            'batch_number': f'BATCH-{qr_hash.upper()}',
-            'manufacturer': manufacturers[hash(qr_code) % len(manufacturers)],
+            'medicine_name': medicines[pick % len(medicines)],
+            'batch_number': f'BATCH-{digest[:4].hex().upper()}',
+            'manufacturer': manufacturers[(pick >> 32) % len(manufacturers)],
             'expiry_date': '2025-12-31'
         }
     
@@ -213,22 +322,21 @@ class MedicineVerificationService:
         """
         Parse date string to date object
         """
-        if not date_string:
+        # QR JSON can carry any type here; only strings are dates
+        if not date_string or not isinstance(date_string, str):
             return None
         
-        try:
-            # Try different date formats
-            for fmt in ['%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y']:
-                try:
-                    return datetime.strptime(date_string, fmt).date()
-                except ValueError:
-                    continue
-            
-            # If no format works, return None
-            return None
-            
-        except Exception:
-            return None
+        return _parse_date_string(date_string)
+
+# Network status is polled by dashboards; blocks land every ~12s, so a
+# couple of seconds old is fresh enough
+NETWORK_STATUS_TTL = 2.0
+_network_status_cache = {}
+_network_status_lock = threading.Lock()
+
+# Independent JSON-RPC calls are issued side by side, so a status check
+# costs one round-trip to the node rather than one per call
+_rpc_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='web3-rpc')
 
 class BlockchainNetworkService:
     """
@@ -236,14 +344,14 @@ class BlockchainNetworkService:
     """
     
     def __init__(self):
-        self.web3_url = getattr(settings, 'WEB3_PROVIDER_URL', '')
-        self.private_key = getattr(settings, 'BLOCKCHAIN_PRIVATE_KEY', '')
+        self.web3_url = _WEB3_URL
+        self.private_key = _PRIVATE_KEY
         
         if self.web3_url:
             try:
-                self.web3 = Web3(Web3.HTTPProvider(self.web3_url))
+                self.web3 = _web3_for(self.web3_url)
                 if self.private_key:
-                    self.account = self.web3.eth.account.from_key(self.private_key)
+                    self.account = _account_for(self.private_key)
                 else:
                     self.account = None
             except Exception as e:
@@ -262,23 +370,36 @@ class BlockchainNetworkService:
             if not self.web3:
                 return self._mock_network_status()
             
-            # Get network information
-            latest_block = self.web3.eth.block_number
-            gas_price = self.web3.eth.gas_price
+            cache_key = (self.web3_url, self.account.address if self.account else None)
+            with _network_status_lock:
+                cached = _network_status_cache.get(cache_key)
+            if cached and time.monotonic() - cached[0] < NETWORK_STATUS_TTL:
+                return dict(cached[1])
             
+            # Get network information
+            eth = self.web3.eth
+            block_future = _rpc_pool.submit(lambda: eth.block_number)
+            gas_price_future = _rpc_pool.submit(lambda: eth.gas_price)
+            connected_future = _rpc_pool.submit(self.web3.is_connected)
             # Get account balance if account is available
+            balance_future = _rpc_pool.submit(eth.get_balance, self.account.address) if self.account else None
+            
+            latest_block = block_future.result()
+            gas_price = gas_price_future.result()
             balance = "0"
-            if self.account:
-                balance_wei = self.web3.eth.get_balance(self.account.address)
-                balance = self.web3.from_wei(balance_wei, 'ether')
+            if balance_future:
+                balance = self.web3.from_wei(balance_future.result(), 'ether')
             
-            return {
+            network_status = {
                 'network_name': 'Ethereum Sepolia Testnet',
-                'is_connected': self.web3.is_connected(),
+                'is_connected': connected_future.result(),
                 'latest_block': latest_block,
                 'gas_price': f"{self.web3.from_wei(gas_price, 'gwei')} gwei",
                 'account_balance': f"{balance} ETH"
             }
+            with _network_status_lock:
+                _network_status_cache[cache_key] = (time.monotonic(), network_status)
+            return dict(network_status)
             
         except Exception as e:
             logger.error(f"Network status error: {str(e)}")
@@ -292,13 +413,15 @@ class BlockchainNetworkService:
             if not self.web3:
                 return self._mock_transaction_status(tx_hash)
             
-            # Get transaction receipt
+            # Get transaction receipt and the chain head together
+            eth = self.web3.eth
+            receipt_future = _rpc_pool.submit(eth.get_transaction_receipt, tx_hash)
+            block_future = _rpc_pool.submit(lambda: eth.block_number)
             try:
-                tx_receipt = self.web3.eth.get_transaction_receipt(tx_hash)
-                tx = self.web3.eth.get_transaction(tx_hash)
+                tx_receipt = receipt_future.result()
                 
                 # Calculate confirmations
-                current_block = self.web3.eth.block_number
+                current_block = block_future.result()
                 confirmations = current_block - tx_receipt.blockNumber
                 
                 return {
@@ -328,16 +451,33 @@ class BlockchainNetworkService:
                 'error': str(e)
             }
     
-    def create_blockchain_transaction(self, transaction_type, data_hash):
+    def create_blockchain_transaction(self, transaction_type, data_hash, idempotent=False):
         """
         Create and send blockchain transaction
+        
+        Returns the BlockchainTransaction record; its transaction_hash is the
+        on-chain hash. With ``idempotent`` a record that already holds the
+        same transaction hash (as mock hashes do for a repeated data hash) is
+        returned instead of failing the insert.
+        """
+        blockchain_tx = self._build_transaction(transaction_type, data_hash)
+        if not idempotent:
+            blockchain_tx.save()
+            return blockchain_tx
+        
+        BlockchainTransaction.objects.bulk_create([blockchain_tx], ignore_conflicts=True)
+        return BlockchainTransaction.objects.get(transaction_hash=blockchain_tx.transaction_hash)
+    
+    def _build_transaction(self, transaction_type, data_hash):
+        """
+        Send the transaction and return its unsaved record
         """
         try:
             if not self.web3 or not self.account:
-                return self._mock_create_transaction(transaction_type, data_hash)
+                return self._mock_transaction(transaction_type, data_hash)
             
             # Create transaction
-            contract_address = getattr(settings, 'MEDICAL_RECORDS_CONTRACT_ADDRESS', '')
+            contract_address = _MEDICAL_RECORDS_CONTRACT_ADDRESS
             
             transaction = {
                 'to': contract_address,
@@ -352,8 +492,7 @@ class BlockchainNetworkService:
             signed_txn = self.web3.eth.account.sign_transaction(transaction, self.private_key)
             tx_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
             
-            # Create blockchain transaction record
-            blockchain_tx = BlockchainTransaction.objects.create(
+            return BlockchainTransaction(
                 transaction_type=transaction_type,
                 transaction_hash=tx_hash.hex(),
                 contract_address=contract_address,
@@ -363,11 +502,9 @@ class BlockchainNetworkService:
                 status='pending'
             )
             
-            return tx_hash.hex()
-            
         except Exception as e:
             logger.error(f"Transaction creation error: {str(e)}")
-            return self._mock_create_transaction(transaction_type, data_hash)
+            return self._mock_transaction(transaction_type, data_hash)
     
     def _encode_contract_data(self, transaction_type, data_hash):
         """
@@ -402,23 +539,20 @@ class BlockchainNetworkService:
             'error': None
         }
     
-    def _mock_create_transaction(self, transaction_type, data_hash):
+    def _mock_transaction(self, transaction_type, data_hash):
         """
-        Mock transaction creation for development
+        Mock transaction for development; the record is returned unsaved
         """
         # Generate mock transaction hash
-        mock_hash = f"0x{''.join([f'{ord(c):02x}' for c in data_hash[:32]])}"
+        mock_hash = "0x" + data_hash[:32].encode('latin-1').hex()
         
-        # Create blockchain transaction record
-        BlockchainTransaction.objects.create(
+        return BlockchainTransaction(
             transaction_type=transaction_type,
             transaction_hash=mock_hash,
             contract_address='0x1234567890123456789012345678901234567890',
             data_hash=data_hash,
             status='pending'
         )
-        
-        return mock_hash
 
 class SmartContractService:
     """
@@ -426,14 +560,14 @@ class SmartContractService:
     """
     
     def __init__(self):
-        self.web3_url = getattr(settings, 'WEB3_PROVIDER_URL', '')
-        self.private_key = getattr(settings, 'BLOCKCHAIN_PRIVATE_KEY', '')
+        self.web3_url = _WEB3_URL
+        self.private_key = _PRIVATE_KEY
         
         if self.web3_url:
             try:
-                self.web3 = Web3(Web3.HTTPProvider(self.web3_url))
+                self.web3 = _web3_for(self.web3_url)
                 if self.private_key:
-                    self.account = self.web3.eth.account.from_key(self.private_key)
+                    self.account = _account_for(self.private_key)
                 else:
                     self.account = None
             except Exception as e:
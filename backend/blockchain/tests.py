@@ -1,3 +1,305 @@
-from django.test import TestCase
+import queue
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from authsystem.models import CustomUser
+from consultations.models import Consultation
+
+from . import access_log
+from .consultation_blockchain_service import ConsultationBlockchainService
+from .models import (
+    BlockchainTransaction, ConsultationAccessLog, ConsultationBlockchainRecord, MedicineVerification,
+    PatientConsentRecord
+)
+from .serializers import MedicineVerificationSerializer, PatientConsentRecordSerializer
+from .services import BlockchainNetworkService
+
+
+class CreateBlockchainTransactionTests(TestCase):
+    def setUp(self):
+        # No signing key in the test settings, so transactions are mocked
+        self.service = BlockchainNetworkService()
+        self.data_hash = 'ab' * 32
+
+    def test_creates_pending_record(self):
+        tx = self.service.create_blockchain_transaction('medical_record', self.data_hash)
+
+        tx.refresh_from_db()
+        self.assertEqual(tx.status, 'pending')
+        self.assertEqual(tx.data_hash, self.data_hash)
+        self.assertEqual(tx.transaction_hash, '0x' + self.data_hash[:32].encode().hex())
+
+    def test_idempotent_create_returns_existing_record(self):
+        first = self.service.create_blockchain_transaction(
+            'medical_record', self.data_hash, idempotent=True
+        )
+        second = self.service.create_blockchain_transaction(
+            'medical_record', self.data_hash, idempotent=True
+        )
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(BlockchainTransaction.objects.count(), 1)
+
+
+@mock.patch.object(access_log.writer, 'start', lambda: None)
+class AccessLogQueueTests(TestCase):
+    def setUp(self):
+        self.patient = CustomUser.objects.create_user(username='patient', password='x')
+        consultation = Consultation.objects.create(
+            patient=self.patient, symptoms_text='fever', ai_response='rest', severity_score=2
+        )
+        self.service = ConsultationBlockchainService()
+        self.record = self.service.store_consultation_on_blockchain(consultation)
+        self.request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.7', HTTP_USER_AGENT='tests')
+
+    def _log_access(self, times):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(times):
+                self.service.log_consultation_access(self.record, self.patient, self.request)
+
+    def test_entries_are_written_when_flushed(self):
+        with mock.patch.object(access_log.writer, 'queue', queue.Queue(maxsize=10)):
+            self._log_access(3)
+            self.assertEqual(ConsultationAccessLog.objects.count(), 0)
+
+            access_log.flush()
+
+        logs = ConsultationAccessLog.objects.all()
+        self.assertEqual(len(logs), 3)
+        self.assertEqual({(log.access_type, log.ip_address) for log in logs}, {('patient', '10.0.0.7')})
+
+    def test_full_queue_saves_on_calling_thread(self):
+        with mock.patch.object(access_log.writer, 'queue', queue.Queue(maxsize=1)):
+            self._log_access(3)
+            self.assertEqual(ConsultationAccessLog.objects.count(), 2)
+
+            access_log.flush()
+
+        self.assertEqual(ConsultationAccessLog.objects.count(), 3)
+
+    def test_failed_batch_insert_falls_back_to_single_saves(self):
+        with mock.patch.object(access_log.writer, 'queue', queue.Queue(maxsize=10)):
+            self._log_access(2)
+            with mock.patch.object(
+                ConsultationAccessLog.objects, 'bulk_create', side_effect=DatabaseError('locked')
+            ):
+                access_log.flush()
+
+        self.assertEqual(ConsultationAccessLog.objects.count(), 2)
+
+
+class ConsultationIntegrityTests(TestCase):
+    def setUp(self):
+        patient = CustomUser.objects.create_user(username='patient', password='x')
+        self.consultation = Consultation.objects.create(
+            patient=patient, symptoms_text='fever', ai_response='rest', severity_score=2
+        )
+        self.service = ConsultationBlockchainService()
+
+    def test_records_verify_under_their_hash_version(self):
+        record = self.service.store_consultation_on_blockchain(self.consultation)
+        self.assertEqual(record.hash_version, 2)
+        self.assertTrue(self.service.verify_consultation_integrity(record)['verified'])
+
+        legacy = self.service.hash_consultation(self.consultation, version=1)
+        ConsultationBlockchainRecord.objects.filter(pk=record.pk).update(
+            hash_version=1, consultation_hash=legacy['consultation_hash'],
+            symptoms_hash=legacy['symptoms_hash'], ai_response_hash=legacy['ai_response_hash']
+        )
+        record = ConsultationBlockchainRecord.objects.get(pk=record.pk)
+        self.assertTrue(self.service.verify_consultation_integrity(record)['verified'])
+
+    def test_edits_that_skip_updated_at_are_detected(self):
+        record = self.service.store_consultation_on_blockchain(self.consultation)
+        self.assertTrue(self.service.verify_consultation_integrity(record)['verified'])
+
+        # QuerySet.update() leaves the auto_now updated_at untouched
+        Consultation.objects.filter(pk=self.consultation.pk).update(symptoms_text='cough')
+        record = ConsultationBlockchainRecord.objects.get(pk=record.pk)
+
+        result = self.service.verify_consultation_integrity(record)
+        self.assertFalse(result['verified'])
+        self.assertEqual(result['message'], 'Data integrity compromised')
+
+
+class StatusFieldTests(TestCase):
+    def setUp(self):
+        self.patient = CustomUser.objects.create_user(username='patient', password='x')
+
+    def test_is_expired_with_and_without_annotation(self):
+        medicine = MedicineVerification.objects.create(
+            medicine_name='Paracetamol', batch_number='B1', manufacturer='Cipla Uganda',
+            expiry_date=date.today() - timedelta(days=1), qr_code='QR-EXPIRED'
+        )
+        annotated = MedicineVerification.objects.with_status().get(pk=medicine.pk)
+
+        self.assertIs(MedicineVerificationSerializer(medicine).data['is_expired'], True)
+        self.assertIs(MedicineVerificationSerializer(annotated).data['is_expired'], True)
+
+    def test_is_active_with_and_without_annotation(self):
+        consent = PatientConsentRecord.objects.create(
+            patient=self.patient, consent_type='data_sharing', granted=True,
+            consent_text='I agree', consent_hash='0' * 64
+        )
+        annotated = PatientConsentRecord.objects.with_status().get(pk=consent.pk)
+        self.assertIs(PatientConsentRecordSerializer(consent).data['is_active'], True)
+        self.assertIs(PatientConsentRecordSerializer(annotated).data['is_active'], True)
+
+        consent.revoked_at = timezone.now()
+        consent.save()
+        self.assertIs(PatientConsentRecordSerializer(consent).data['is_active'], False)
+
+    def test_annotation_is_used_without_the_property(self):
+        MedicineVerification.objects.create(
+            medicine_name='Paracetamol', batch_number='B2', manufacturer='Cipla Uganda',
+            expiry_date=date.today() + timedelta(days=30), qr_code='QR-FRESH'
+        )
+        PatientConsentRecord.objects.create(
+            patient=self.patient, consent_type='data_sharing', granted=True,
+            consent_text='I agree', consent_hash='1' * 64
+        )
+        medicine = MedicineVerification.objects.with_status().get()
+        consent = PatientConsentRecord.objects.with_status().get()
+
+        with mock.patch.object(MedicineVerification, 'has_expired', new_callable=mock.PropertyMock) as has_expired, \
+                mock.patch.object(PatientConsentRecord, 'in_effect', new_callable=mock.PropertyMock) as in_effect:
+            self.assertIs(MedicineVerificationSerializer(medicine).data['is_expired'], False)
+            self.assertIs(PatientConsentRecordSerializer(consent).data['is_active'], True)
+
+        has_expired.assert_not_called()
+        in_effect.assert_not_called()
+
+
+class BulkMedicineVerificationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user(username='pharmacist', password='x'))
+        self.known = MedicineVerification.objects.create(
+            medicine_name='Paracetamol', batch_number='K1', manufacturer='Cipla Uganda',
+            expiry_date=date(2020, 1, 1), qr_code='Paracetamol|K1|Cipla Uganda|2020-01-01',
+            verification_status='authentic'
+        )
+
+    def verify(self, qr_codes):
+        return self.client.post(reverse('medicine-verify-bulk'), {'qr_codes': qr_codes}, format='json')
+
+    def test_results_follow_request_order(self):
+        new_code = 'Amoxicillin|N1|Quality Chemicals|2099-06-30'
+        counterfeit = 'Chloroquine|C1|Medic Pharma|2099-06-30'
+        unknown = 'Aspirin|U1|Nobody|2099-06-30'
+
+        response = self.verify([new_code, self.known.qr_code, unknown, new_code, counterfeit])
+
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual(
+            [(r['qr_code'], r['verification_status']) for r in results],
+            [(new_code, 'authentic'), (self.known.qr_code, 'authentic'),
+             (unknown, 'unknown'), (counterfeit, 'counterfeit')]
+        )
+        self.assertEqual(results[1]['warning'], 'Medicine has expired')
+        self.assertNotIn('warning', results[0])
+        self.assertFalse(results[2]['verified'])
+        self.assertEqual(MedicineVerification.objects.count(), 3)
+
+    def test_codes_already_saved_are_not_inserted_again(self):
+        code = 'Amoxicillin|N1|Quality Chemicals|2099-06-30'
+        self.verify([code])
+
+        response = self.verify([code])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['message'], 'Medicine verification retrieved from database')
+        self.assertEqual(MedicineVerification.objects.filter(qr_code=code).count(), 1)
+
+    def test_batch_limit(self):
+        codes = [f'Paracetamol|B{index}|Cipla Uganda|2099-01-01' for index in range(501)]
+
+        self.assertEqual(self.verify(codes).status_code, 400)
+        self.assertEqual(self.verify([]).status_code, 400)
+
+
+class MigrationTestCase(TransactionTestCase):
+    """Moves the blockchain app between migrations; the latest state is restored afterwards"""
+
+    def migrate(self, name):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('blockchain', name)])
+        return executor.loader.project_state([('blockchain', name)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+
+class TransactionFeeWeiMigrationTests(MigrationTestCase):
+    def test_fees_round_trip_beyond_bigint_range(self):
+        apps = self.migrate('0011_access_log_packed_ip')
+        Transaction = apps.get_model('blockchain', 'BlockchainTransaction')
+        for index, fee in enumerate([Decimal('25.5'), Decimal('0.000021'), None]):
+            Transaction.objects.create(
+                transaction_type='medical_record', transaction_hash=f'0x{index}',
+                contract_address='0x0', data_hash='0' * 64, transaction_fee=fee
+            )
+
+        apps = self.migrate('0012_transaction_fee_wei')
+        Transaction = apps.get_model('blockchain', 'BlockchainTransaction')
+        self.assertEqual(
+            dict(Transaction.objects.values_list('transaction_hash', 'transaction_fee_wei')),
+            {'0x0': Decimal(25_500_000_000_000_000_000), '0x1': Decimal(21_000_000_000_000), '0x2': None}
+        )
+
+        apps = self.migrate('0011_access_log_packed_ip')
+        Transaction = apps.get_model('blockchain', 'BlockchainTransaction')
+        self.assertEqual(
+            dict(Transaction.objects.values_list('transaction_hash', 'transaction_fee')),
+            {'0x0': Decimal('25.5'), '0x1': Decimal('0.000021'), '0x2': None}
+        )
+
+
+class AccessLogBigintMigrationTests(MigrationTestCase):
+    def test_logs_survive_the_table_copy_both_ways(self):
+        apps = self.migrate('0005_provider_access_active_index')
+        Record = apps.get_model('blockchain', 'ConsultationBlockchainRecord')
+        AccessLog = apps.get_model('blockchain', 'ConsultationAccessLog')
+        # Only blockchain is rolled back; the other apps keep their latest models
+        patient = CustomUser.objects.create_user(username='migrated', password='x')
+        consultation = Consultation.objects.create(
+            patient=patient, symptoms_text='fever', ai_response='rest', severity_score=2
+        )
+        record = Record.objects.create(
+            consultation_id=consultation.pk, patient_id=patient.pk, consultation_hash='a' * 64,
+            symptoms_hash='b' * 64, ai_response_hash='c' * 64, encryption_key_hash='d' * 64
+        )
+        start = timezone.now() - timedelta(hours=1)
+        for minutes, ip_address in [(2, '10.0.0.2'), (0, '10.0.0.0'), (1, '10.0.0.1')]:
+            AccessLog.objects.create(
+                consultation_record=record, accessed_by_id=patient.pk, access_type='patient',
+                ip_address=ip_address, user_agent='tests', accessed_at=start + timedelta(minutes=minutes)
+            )
+
+        apps = self.migrate('0006_consultation_access_log_bigint_pk')
+        AccessLog = apps.get_model('blockchain', 'ConsultationAccessLog')
+        logs = list(AccessLog.objects.order_by('id').values_list('id', 'ip_address', 'consultation_record_id'))
+        self.assertTrue(all(isinstance(log_id, int) for log_id, _, _ in logs))
+        # Ids are handed out in access order
+        self.assertEqual(
+            [(ip_address, record_id) for _, ip_address, record_id in logs],
+            [('10.0.0.0', record.pk), ('10.0.0.1', record.pk), ('10.0.0.2', record.pk)]
+        )
+
+        apps = self.migrate('0005_provider_access_active_index')
+        AccessLog = apps.get_model('blockchain', 'ConsultationAccessLog')
+        self.assertEqual(
+            list(AccessLog.objects.order_by('accessed_at').values_list('ip_address', flat=True)),
+            ['10.0.0.0', '10.0.0.1', '10.0.0.2']
+        )
+        self.assertEqual(AccessLog.objects.values('id').distinct().count(), 3)
@@ -4,6 +4,7 @@ from . import views
 urlpatterns = [
     # Medicine verification
     path('medicine/verify/', views.MedicineVerificationView.as_view(), name='medicine-verify'),
+    path('medicine/verify/bulk/', views.BulkMedicineVerificationView.as_view(), name='medicine-verify-bulk'),
     path('medicine/verifications/', views.MedicineVerificationListView.as_view(), name='medicine-verifications'),
     path('medicine/batch/<str:batch_number>/', views.get_medicine_batch_info, name='medicine-batch-info'),
     
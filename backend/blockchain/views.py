@@ -10,9 +10,11 @@ from .models import (
     SmartContract, PatientConsentRecord
 )
 from .serializers import (
-    BlockchainTransactionSerializer, MedicineVerificationSerializer,
-    MedicineVerificationCreateSerializer, QRCodeVerificationSerializer,
-    SmartContractSerializer, PatientConsentRecordSerializer,
+    BlockchainTransactionListSerializer, MedicineVerificationSerializer,
+    MedicineVerificationListSerializer, MedicineVerificationCreateSerializer,
+    QRCodeVerificationSerializer, BulkQRCodeVerificationSerializer,
+    SmartContractSerializer,
+    PatientConsentRecordSerializer, PatientConsentRecordListSerializer,
     ConsentCreateSerializer, BlockchainStatusSerializer,
     TransactionStatusSerializer
 )
@@ -110,55 +112,148 @@ class MedicineVerificationView(APIView):
                 'error': f'Medicine verification failed: {str(e)}'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+class BulkMedicineVerificationView(APIView):
+    """
+    Verify a batch of medicine QR codes in one request
+    POST /api/medicine/verify/bulk/
+    
+    Known codes are read with a single query and newly recognised ones are
+    saved with a single insert; results come back in request order.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        serializer = BulkQRCodeVerificationSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            from datetime import date
+            qr_codes = serializer.validated_data['qr_codes']
+            
+            known = MedicineVerification.objects.filter(qr_code__in=qr_codes).in_bulk(field_name='qr_code')
+            
+            # Verify the codes we haven't seen, as the single-code endpoint does
+            verification_service = MedicineVerificationService()
+            created = {}
+            messages = {}
+            for qr_code in qr_codes:
+                if qr_code in known:
+                    continue
+                verification_result = verification_service.verify_medicine(qr_code)
+                if verification_result['found']:
+                    medicine = MedicineVerification(
+                        medicine_name=verification_result['medicine_name'],
+                        batch_number=verification_result['batch_number'],
+                        manufacturer=verification_result['manufacturer'],
+                        expiry_date=verification_result['expiry_date'],
+                        qr_code=qr_code,
+                        verification_status=verification_result['status']
+                    )
+                    medicine.blockchain_verified = verification_service.verify_on_blockchain(medicine)['verified']
+                    created[qr_code] = medicine
+                    messages[qr_code] = verification_result['message']
+            
+            # A concurrent scan may have saved the same code first
+            MedicineVerification.objects.bulk_create(created.values(), ignore_conflicts=True)
+            
+            today = date.today()
+            results = []
+            for qr_code in qr_codes:
+                medicine = known.get(qr_code) or created.get(qr_code)
+                if medicine is None:
+                    results.append({
+                        'qr_code': qr_code,
+                        'verified': False,
+                        'verification_status': 'unknown',
+                        'message': 'Medicine not found in verification database'
+                    })
+                    continue
+                
+                result = {
+                    'qr_code': qr_code,
+                    'medicine_name': medicine.medicine_name,
+                    'batch_number': medicine.batch_number,
+                    'manufacturer': medicine.manufacturer,
+                    'expiry_date': medicine.expiry_date,
+                    'verification_status': medicine.verification_status,
+                    'blockchain_verified': medicine.blockchain_verified,
+                    'verified_at': medicine.verified_at,
+                    'message': messages.get(qr_code, 'Medicine verification retrieved from database')
+                }
+                if medicine.expiry_date and medicine.expiry_date < today:
+                    result['warning'] = 'Medicine has expired'
+                results.append(result)
+            
+            return Response({
+                'results': results,
+                'total_count': len(results)
+            })
+        
+        except Exception as e:
+            return Response({
+                'error': f'Medicine verification failed: {str(e)}'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 class MedicineVerificationListView(generics.ListCreateAPIView):
     """
     List medicine verifications or create new verification
+    
+    Lists are served from .values() rows rather than model instances.
     """
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         # Only admins and healthcare providers can see all verifications
         if self.request.user.user_type in ['admin', 'doctor', 'nurse']:
-            return MedicineVerification.objects.all()
+            return MedicineVerification.objects.with_status().values(
+                *MedicineVerificationListSerializer.columns
+            )
         return MedicineVerification.objects.none()
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return MedicineVerificationCreateSerializer
-        return MedicineVerificationSerializer
+        return MedicineVerificationListSerializer
 
 class BlockchainTransactionListView(generics.ListAPIView):
     """
     List blockchain transactions
     """
-    serializer_class = BlockchainTransactionSerializer
+    serializer_class = BlockchainTransactionListSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
         # Only admins can see all transactions
         if self.request.user.user_type == 'admin':
-            return BlockchainTransaction.objects.all()
+            return BlockchainTransaction.objects.values(
+                *BlockchainTransactionListSerializer.columns
+            )
         return BlockchainTransaction.objects.none()
 
 class PatientConsentListCreateView(generics.ListCreateAPIView):
     """
     List patient consent records or create new consent
+    
+    Lists are served from .values() rows rather than model instances.
     """
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
+        consents = PatientConsentRecord.objects.with_status()
         # Patients can only see their own consent records
         if self.request.user.user_type == 'patient':
-            return PatientConsentRecord.objects.filter(patient=self.request.user)
+            consents = consents.filter(patient=self.request.user)
         # Healthcare providers can see consents for their patients
-        elif self.request.user.user_type in ['doctor', 'nurse', 'admin']:
-            return PatientConsentRecord.objects.all()
-        return PatientConsentRecord.objects.none()
+        elif self.request.user.user_type not in ['doctor', 'nurse', 'admin']:
+            return PatientConsentRecord.objects.none()
+        return consents.values(*PatientConsentRecordListSerializer.columns)
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return ConsentCreateSerializer
-        return PatientConsentRecordSerializer
+        return PatientConsentRecordListSerializer
     
     def perform_create(self, serializer):
         # Create consent hash
@@ -220,6 +315,10 @@ def check_transaction_status(request):
         blockchain_service = BlockchainNetworkService()
         tx_status = blockchain_service.get_transaction_status(tx_hash)
         
+        # Record the confirmation on our copy of the transaction, if any
+        if tx_status['status'] == 'confirmed':
+            BlockchainTransaction.objects.mark_confirmed({tx_hash: tx_status['block_number']})
+        
         return Response({
             'transaction_hash': tx_hash,
             'status': tx_status['status'],
@@ -244,7 +343,7 @@ def revoke_consent(request, consent_id):
     try:
         if request.user.user_type == 'patient':
             consent = get_object_or_404(
-                PatientConsentRecord,
+                PatientConsentRecord.objects.with_related(),
                 id=consent_id,
                 patient=request.user
             )
@@ -279,7 +378,7 @@ def get_medicine_batch_info(request, batch_number):
     Get information about a medicine batch
     """
     try:
-        medicines = MedicineVerification.objects.filter(
+        medicines = MedicineVerification.objects.with_status().filter(
             batch_number=batch_number
         )
         
@@ -329,6 +428,15 @@ def get_patient_consultation_records(request):
                 'error': 'Access denied'
             }, status=status.HTTP_403_FORBIDDEN)
         
+        # Only the listed columns; the joined consultation's AI response and
+        # recommended actions are the widest and are not shown here
+        consultation_records = consultation_records.only(
+            'id', 'consultation_hash', 'stored_on_blockchain', 'encrypted',
+            'created_at', 'patient', 'patient__username', 'consultation',
+            'consultation__symptoms_text', 'consultation__severity_score',
+            'consultation__emergency_detected', 'consultation__language'
+        )
+        
         records_data = []
         for record in consultation_records:
             # Log access
@@ -449,7 +557,7 @@ def get_consultation_details(request, consultation_record_id):
         
         # Get consultation record
         try:
-            consultation_record = ConsultationBlockchainRecord.objects.get(id=consultation_record_id)
+            consultation_record = ConsultationBlockchainRecord.objects.with_related().get(id=consultation_record_id)
         except ConsultationBlockchainRecord.DoesNotExist:
             return Response({
                 'error': 'Consultation record not found'
@@ -0,0 +1,97 @@
+"""
+Write-behind queue for audit rows
+Request threads enqueue unsaved model instances; a daemon thread writes
+them with bulk_create. When the queue is full a row is saved on the
+calling thread, and when a batch insert fails its rows are saved one by one
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """
+    Batches inserts of one model on a background thread
+
+    ``prepare`` is called on each instance before the batch insert, for
+    work that ``save()`` would otherwise do (bulk_create skips it).
+    """
+
+    def __init__(self, model, name, batch_size=500, flush_interval=0.5, maxsize=10000, prepare=None):
+        self.model = model
+        self.name = name
+        self.batch_size = batch_size
+        # How long the worker waits after the first row to gather a batch
+        self.flush_interval = flush_interval
+        self.prepare = prepare
+        self.queue = queue.Queue(maxsize=maxsize)
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def put(self, instance):
+        """Queue an unsaved instance, saving it here if the queue is full"""
+        self.start()
+        try:
+            self.queue.put_nowait(instance)
+        except queue.Full:
+            instance.save(force_insert=True)
+
+    def flush(self):
+        """Write every queued row now"""
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return
+            self._write(batch)
+
+    def start(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch):
+        try:
+            if self.prepare is not None:
+                for instance in batch:
+                    self.prepare(instance)
+            self.model.objects.bulk_create(batch, batch_size=self.batch_size)
+            return
+        except Exception as e:
+            logger.warning(f"Batch insert of {len(batch)} {self.model._meta.verbose_name_plural} failed, saving one by one: {e}")
+
+        # One bad row shouldn't cost the rest of the batch its audit trail
+        for instance in batch:
+            try:
+                instance.save(force_insert=True)
+            except Exception as e:
+                logger.error(f"Failed to write {self.model._meta.verbose_name}: {e}")
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            time.sleep(self.flush_interval)
+            try:
+                self._write([first] + self._drain(self.batch_size - 1))
+            finally:
+                # The worker holds its own connection; don't leave it open idle
+                connection.close()